@@ -0,0 +1,24 @@
+# every letter maps to a prime, so a word's signature is the product of its
+# letters' primes and word b can be built from the letters of word a exactly
+# when signature(a) is divisible by signature(b). frequent letters get the
+# small primes to keep the products short
+LETTER_PRIMES = dict(zip(
+    'etaoinshrdlcumwfgypbvkjxqz',
+    (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97, 101),
+))
+
+
+def signature(word: str) -> int:
+    # 0 for words with anything but lowercase latin letters
+    product = 1
+    for letter in word:
+        prime = LETTER_PRIMES.get(letter)
+        if prime is None:
+            return 0
+        product *= prime
+    return product
+
+
+def contains(reference: int, word: str) -> bool:
+    word_signature = signature(word)
+    return word_signature != 0 and reference % word_signature == 0
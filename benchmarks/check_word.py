@@ -0,0 +1,48 @@
+# python -m benchmarks.check_word
+import timeit
+from collections import Counter
+
+from anagrams import contains, signature
+from data.words import WORDS
+
+NUMBER = 100_000
+
+
+def counter_check_word(reference, word):
+    # Room.check_word before the letter signatures
+    word_counter = Counter(word)
+    reference_counter = Counter(reference)
+
+    for letter, count in word_counter.items():
+        if count > reference_counter.get(letter, 0):
+            return False
+
+    return True
+
+
+def main():
+    reference = 'contribution'
+    reference_signature = signature(reference)
+    submissions = ['bunion', 'tribute', 'contort', 'ruin', 'aaa', 'tonic', 'robin', 'zebra']
+
+    for word in submissions + list(WORDS):
+        assert counter_check_word(reference, word) == contains(reference_signature, word), word
+
+    def run_counter():
+        for word in submissions:
+            counter_check_word(reference, word)
+
+    def run_signature():
+        for word in submissions:
+            contains(reference_signature, word)
+
+    counter_time = min(timeit.repeat(run_counter, number=NUMBER // len(submissions), repeat=5))
+    signature_time = min(timeit.repeat(run_signature, number=NUMBER // len(submissions), repeat=5))
+
+    print(f'Counter:   {counter_time / NUMBER * 1e9:8.0f} ns per word')
+    print(f'signature: {signature_time / NUMBER * 1e9:8.0f} ns per word')
+    print(f'speedup:   {counter_time / signature_time:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# python -m benchmarks.codecs [--detail]
+import argparse
+import pickle
+import timeit
+
+from codec import CODECS, CodecError
+
+NUMBER = 20_000
+
+MESSAGES = [
+    {'command': 'registration', 'name': 'player', 'password': 'secret'},
+    {'command': 'create_room', 'room': 'lobby 1'},
+    {'command': 'submit_word', 'room': 'lobby 1', 'word': 'tribute', 'player': 'player'},
+    {'type': 'registration', 'message': 'ok'},
+    {'type': 'info', 'message': 'player joined lobby 1'},
+    {'type': 'rooms', 'message': {f'room {i}': i % 5 for i in range(20)}},
+    {'type': 'room_player_count', 'room': 'lobby 1', 'players': 3},
+    {'type': 'table', 'message': {f'player {i}': 100 - i for i in range(50)}},
+    {'type': 'score', 'scores': {'player': 4, 'other': 2, 'third': 7}},
+    {'type': 'timer', 'message': '60'},
+    {'type': 'start', 'word': 'contribution'},
+    {'type': 'end', 'message': 'game ended. found 12 of 386 words'},
+]
+
+
+class PickleCodec:
+    # the format the protocol used before, for reference only
+    name = 'pickle'
+
+    def encode(self, message):
+        return pickle.dumps(message)
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+
+def codecs():
+    yield PickleCodec()
+    for codec_class in CODECS.values():
+        try:
+            yield codec_class()
+        except CodecError as e:
+            print(f'skipping {codec_class.name}: {e}')
+
+
+def detail(codec):
+    # microseconds per message, the maps cost per entry where the rest is fixed overhead
+    for message in MESSAGES:
+        payload = codec.encode(message)
+        encode_time = min(timeit.repeat(lambda: codec.encode(message), number=NUMBER // 10, repeat=3))
+        decode_time = min(timeit.repeat(lambda: codec.decode(payload), number=NUMBER // 10, repeat=3))
+        label = message.get('command') or message['type']
+        print(f'  {label:18} {encode_time / (NUMBER // 10) * 1e6:8.2f}us {decode_time / (NUMBER // 10) * 1e6:8.2f}us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='throughput and size of the wire codecs')
+    parser.add_argument('--detail', action='store_true', help='also time every sample message on its own')
+    args = parser.parse_args()
+
+    print(f'{"codec":10} {"encode/s":>12} {"decode/s":>12} {"bytes/msg":>10}')
+    for codec in codecs():
+        payloads = [codec.encode(message) for message in MESSAGES]
+        for message, payload in zip(MESSAGES, payloads):
+            assert codec.decode(payload) == message, (codec.name, message)
+
+        def run_encode():
+            for message in MESSAGES:
+                codec.encode(message)
+
+        def run_decode():
+            for payload in payloads:
+                codec.decode(payload)
+
+        count = NUMBER // len(MESSAGES) * len(MESSAGES)
+        encode_time = min(timeit.repeat(run_encode, number=NUMBER // len(MESSAGES), repeat=3))
+        decode_time = min(timeit.repeat(run_decode, number=NUMBER // len(MESSAGES), repeat=3))
+        size = sum(map(len, payloads)) / len(payloads)
+        print(f'{codec.name:10} {count / encode_time:12.0f} {count / decode_time:12.0f} {size:10.1f}')
+        if args.detail:
+            detail(codec)
+
+
+if __name__ == '__main__':
+    main()
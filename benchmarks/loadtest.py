@@ -0,0 +1,267 @@
+# python -m benchmarks.loadtest --spawn-server asyncio --bots 200
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bot import Bot, Stats
+from protocol import FrameDecoder, encode, recv_messages
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def process_usage(pid: int):
+    # (cpu seconds, rss bytes) from /proc, None where that isn't available
+    try:
+        with open(f'/proc/{pid}/stat') as file:
+            fields = file.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/status') as file:
+            status = dict(line.split(':', 1) for line in file)
+    except OSError:
+        return None
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    rss = int(status['VmRSS'].split()[0]) * 1024
+    return cpu, rss
+
+
+def children(pid: int) -> list:
+    # pids whose parent is pid, e.g. the workers of a sharded server
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as file:
+                parent = int(file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            pids.append(int(entry))
+    return pids
+
+
+def tree_usage(pid: int):
+    # process_usage() of pid and its children added up
+    usage = process_usage(pid)
+    if usage is None:
+        return None
+    cpu, rss = usage
+    for child in children(pid):
+        usage = process_usage(child)
+        if usage is not None:
+            cpu += usage[0]
+            rss += usage[1]
+    return cpu, rss
+
+
+class Monitor:
+    # samples the server process, workers included, while the bots play
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.first = None
+        self.last = None
+        self.peak_rss = 0
+
+    async def run(self):
+        while True:
+            usage = tree_usage(self.pid)
+            if usage is None:
+                return
+            sample = (time.monotonic(), *usage)
+            self.first = self.first or sample
+            self.last = sample
+            self.peak_rss = max(self.peak_rss, usage[1])
+            await asyncio.sleep(self.interval)
+
+    def summary(self) -> dict:
+        if not self.first or self.last is self.first:
+            return {}
+        wall = self.last[0] - self.first[0]
+        return {
+            'cpu_percent': (self.last[1] - self.first[1]) / wall * 100,
+            'rss_mb': self.last[2] / 2 ** 20,
+            'peak_rss_mb': self.peak_rss / 2 ** 20,
+        }
+
+
+def registers(host: str, port: int) -> bool:
+    with socket.create_connection((host, port), timeout=30) as probe:
+        probe.sendall(encode({'command': 'registration', 'name': 'loadtest-probe', 'password': 'probe'}))
+        decoder = FrameDecoder()
+        while True:
+            messages = recv_messages(probe, decoder)
+            if messages is None:
+                return False
+            if any(message['type'] == 'registration' for message in messages):
+                return True
+
+
+def spawn_server(args) -> (subprocess.Popen, str):
+    # a fresh copy of data/ so the bots' accounts and scores don't end up in the repo
+    workdir = tempfile.mkdtemp(prefix='anagrams-load-')
+    shutil.copytree(os.path.join(REPO, 'data'), os.path.join(workdir, 'data'))
+    with socket.socket() as probe:
+        probe.bind((args.host, 0))
+        args.port = probe.getsockname()[1]
+
+    if args.spawn_server == 'sharded':
+        command = [sys.executable, os.path.join(REPO, 'cluster.py'), '--workers', str(args.workers)]
+    else:
+        command = [sys.executable, os.path.join(REPO, 'server.py'), '--mode', args.spawn_server]
+    server = subprocess.Popen(
+        command + ['--host', args.host, '--port', str(args.port), '--lobby-time', str(args.lobby_time),
+                   '--round-time', str(args.round_time), '--hash-iterations', str(args.hash_iterations)],
+        cwd=workdir, stdout=subprocess.DEVNULL)
+
+    # a listening socket isn't enough, a sharded server accepts only once its
+    # workers are up. it is ready when it answers a registration
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            if registers(args.host, args.port):
+                return server, workdir
+        except OSError:
+            pass
+        time.sleep(0.1)
+
+    server.terminate()
+    server.wait()
+    shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(f'the {args.spawn_server} server on port {args.port} never answered a registration')
+
+
+async def play(bot: Bot, room: str, creator: bool, args, stop_at: float):
+    await asyncio.sleep(random.uniform(0, args.ramp))
+    try:
+        await bot.connect(args.host, args.port)
+    except OSError as e:
+        print(f'{bot.name} could not connect: {e}')
+        bot.stats.errors += 1
+        return
+
+    if await bot.register() is None:
+        return await bot.close()
+
+    if creator:
+        joined = await bot.create_room(room)
+    else:
+        joined = False
+        for _ in range(20):
+            joined = await bot.join_room(room)
+            if joined:
+                break
+            await asyncio.sleep(0.5)
+    if not joined:
+        return await bot.close()
+
+    while time.monotonic() < stop_at:
+        started = bot.expect(lambda m: m['type'] == 'start' or m.get('message') == 'you can not play alone')
+        await bot.start_game(room)
+        message = await bot.wait(started, args.lobby_time + 10)
+        if message is None or message['type'] != 'start':
+            await asyncio.sleep(1)
+            continue
+
+        while not bot.round_over.is_set() and time.monotonic() < stop_at:
+            word, _ = bot.pick_word(args.invalid_ratio)
+            asyncio.create_task(bot.submit_word(room, word))
+            await asyncio.sleep(random.expovariate(args.submit_rate))
+
+        await Bot.wait(asyncio.ensure_future(bot.round_over.wait()), args.round_time + 10)
+
+    await bot.close()
+
+
+async def run(args) -> dict:
+    stats = Stats()
+    monitor = Monitor(args.server_pid) if args.server_pid else None
+    monitor_task = asyncio.create_task(monitor.run()) if monitor else None
+
+    started = time.monotonic()
+    stop_at = started + args.ramp + args.duration
+    bots = []
+    for i in range(args.bots):
+        bot = Bot(f'bot{i}', f'bot{i}', stats)
+        room = f'load-{i // args.room_size}'
+        bots.append(play(bot, room, i % args.room_size == 0, args, stop_at))
+    await asyncio.gather(*bots)
+    elapsed = time.monotonic() - started
+
+    if monitor_task:
+        monitor_task.cancel()
+
+    summary = stats.summary()
+    summary['seconds'] = elapsed
+    summary['messages_per_second'] = (stats.sent + stats.received) / elapsed
+    summary['server'] = monitor.summary() if monitor else {}
+    return summary
+
+
+def report(summary: dict):
+    print(f'{"command":14} {"count":>8} {"p50 ms":>9} {"p99 ms":>9} {"max ms":>9} {"no reply":>9}')
+    for command, row in summary['commands'].items():
+        print(f'{command:14} {row["count"]:8} {row.get("p50_ms", 0):9.2f} {row.get("p99_ms", 0):9.2f} '
+              f'{row.get("max_ms", 0):9.2f} {row["unanswered"]:9}')
+    print(f'{summary["sent"]} sent, {summary["received"]} received in {summary["seconds"]:.1f} s, '
+          f'{summary["messages_per_second"]:.0f} messages/s, {summary["errors"]} errors')
+    server = summary['server']
+    if server:
+        print(f'server: {server["cpu_percent"]:.0f}% cpu, {server["rss_mb"]:.1f} MB rss '
+              f'({server["peak_rss_mb"]:.1f} MB peak)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='drive a game server with headless bots')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=65432)
+    parser.add_argument('--spawn-server', choices=('threaded', 'asyncio', 'sharded'),
+                        help='start a server of this mode on a scratch copy of data/ instead of using a running one')
+    parser.add_argument('--workers', type=int, default=4, help='worker processes of a spawned sharded server')
+    parser.add_argument('--server-pid', type=int, help='pid of a running server to sample cpu and memory from')
+    parser.add_argument('--bots', type=int, default=100)
+    parser.add_argument('--room-size', type=int, default=4)
+    parser.add_argument('--submit-rate', type=float, default=2.0, help='words per second per bot')
+    parser.add_argument('--invalid-ratio', type=float, default=0.3, help='share of junk submissions')
+    parser.add_argument('--duration', type=float, default=60.0, help='seconds of play after the ramp up')
+    parser.add_argument('--ramp', type=float, default=5.0, help='seconds over which the bots connect')
+    parser.add_argument('--lobby-time', type=float, default=2.0, help='lobby countdown of a spawned server')
+    parser.add_argument('--round-time', type=float, default=20.0, help='round length of a spawned server')
+    parser.add_argument('--hash-iterations', type=int, default=1000, help='password work factor of a spawned server')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    # thousands of bots need as many file descriptors
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    server = workdir = None
+    if args.spawn_server:
+        server, workdir = spawn_server(args)
+        args.server_pid = server.pid
+
+    try:
+        summary = asyncio.run(run(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary['config'] = vars(args)
+    report(summary)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(summary, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
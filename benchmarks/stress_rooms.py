@@ -0,0 +1,196 @@
+# python -m benchmarks.stress_rooms --rooms 8 --players 16 --rounds 5
+import argparse
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+
+import server as game_server
+from benchmarks.suite import scratch
+from protocol import FrameDecoder
+from server import GameServer, Session
+
+OWN_WORDS = 30  # words only one player submits
+
+
+class RecordingSession(Session):
+    # keeps the scores as a client applying the score deltas would see them
+    def __init__(self, name: str):
+        super().__init__((name, 0))
+        self.name = name
+        self.lock = threading.Lock()
+        self.scores = {}
+        self.messages = 0
+
+    def send(self, data: bytes):
+        with self.lock:
+            for message in FrameDecoder().feed(data):
+                self.messages += 1
+                if message['type'] == 'score':
+                    if message.get('reset'):
+                        self.scores = {}
+                    self.scores.update(message['scores'])
+
+    def close(self):
+        pass
+
+
+def preempt(method):
+    # gives the gil away around the call. cpython only switches threads at a
+    # few points, and between checking a word and scoring it there is none,
+    # so an unlocked room looks correct by luck; a free-threaded build or a
+    # slower validator has no such luck
+    def call(*args):
+        time.sleep(0)
+        result = method(*args)
+        time.sleep(0)
+        return result
+    return call
+
+
+def play(server: GameServer, session: Session, room: str, words: list, barrier: threading.Barrier):
+    barrier.wait()
+    for word in words:
+        server.handle_message(session, {'command': 'submit_word', 'room': room, 'word': word, 'player': session.name})
+
+
+def churn(server: GameServer, room: str, stop: threading.Event, errors: list):
+    # spectators joining and leaving while the round is played
+    session = RecordingSession(f'{room}-spectator')
+    while not stop.is_set():
+        server.handle_message(session, {'command': 'join_room', 'room': room})
+        if session.room is None or session.room.name != room:
+            errors.append(f'{room}: spectator could not join')
+            return
+        server.handle_message(session, {'command': 'leave_room', 'room': room})
+
+
+def run_round(server: GameServer, args) -> (list, int, float):
+    errors = []
+    threads = []
+    rooms = {}
+    submitted = {}
+    barrier = threading.Barrier(args.rooms * args.players * args.connections)
+
+    for r in range(args.rooms):
+        name = f'stress-{r}'
+        sessions = [RecordingSession(f'{name}-player{i}') for i in range(args.players)]
+        server.handle_message(sessions[0], {'command': 'create_room', 'room': name})
+        for session in sessions[1:]:
+            server.handle_message(session, {'command': 'join_room', 'room': name})
+        for session in sessions:
+            server.handle_message(session, {'command': 'start_game', 'room': name})
+
+        room = server.rooms.get(name)
+        if args.preempt:
+            room.is_valid_word = preempt(room.is_valid_word)
+            room.is_correct_word = preempt(room.is_correct_word)
+        room.timer.cancel()
+        room.start(room.phase)
+        if not room.current_word:
+            errors.append(f'{name}: round did not start')
+            continue
+        solutions = sorted(room.solutions) if room.solutions else []
+        random.shuffle(solutions)
+        contended = solutions[:args.contended]
+        own = min(OWN_WORDS, (len(solutions) - args.contended) // args.players)
+
+        rooms[name] = (room, sessions)
+        submitted[name] = set(contended)
+        for i, session in enumerate(sessions):
+            words = solutions[args.contended + i * own:args.contended + (i + 1) * own]
+            submitted[name].update(words)
+            words = words + contended
+            # a player on several connections submits each word from all of them
+            for _ in range(args.connections):
+                random.shuffle(words)
+                threads.append(threading.Thread(target=play, args=(server, session, name, list(words), barrier)))
+
+    stop = threading.Event()
+    churners = [threading.Thread(target=churn, args=(server, name, stop, errors)) for name in rooms]
+    for thread in churners + threads:
+        thread.start()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in churners:
+        thread.join()
+
+    submissions = 0
+    wins = sum(server.score_store.scores.values())
+    for name, (room, sessions) in rooms.items():
+        scores = dict(room.scores)
+        submissions += sum(len(tried) for tried in room.submissions.values())
+        if sum(scores.values()) != len(room.found):
+            errors.append(f'{name}: {sum(scores.values())} points for {len(room.found)} words')
+        if room.found != submitted[name]:
+            errors.append(f'{name}: {len(room.found)} of {len(submitted[name])} words scored')
+        if len(room.clients) != args.players:
+            errors.append(f'{name}: {len(room.clients)} clients left instead of {args.players}')
+
+        room.timer.cancel()
+        room.game_end(room.phase)
+        for session in sessions:
+            if session.scores != scores:
+                errors.append(f'{name}: {session.name} saw {session.scores} instead of {scores}')
+                break
+        for session in sessions:
+            server.handle_message(session, {'command': 'leave_room', 'room': name})
+
+    if sum(server.score_store.scores.values()) != wins + len(rooms):
+        errors.append(f'{len(rooms)} rounds ended but the leaderboard gained '
+                      f'{sum(server.score_store.scores.values()) - wins} wins')
+    if len(server.rooms) or server.lobby.snapshot():
+        errors.append(f'rooms left behind: {server.rooms.names()}')
+    return errors, submissions, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='concurrent submissions against many rooms, checked for lost '
+                                                 'or doubled points')
+    parser.add_argument('--rooms', type=int, default=8)
+    parser.add_argument('--players', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--contended', type=int, default=10,
+                        help='words every player of a room submits, only one of them may score')
+    parser.add_argument('--connections', type=int, default=2, help='threads submitting for each player')
+    parser.add_argument('--no-preempt', dest='preempt', action='store_false',
+                        help="don't force thread switches inside word validation")
+    parser.add_argument('--switch-interval', type=float, default=1e-6,
+                        help='seconds between forced thread switches, tiny values shake out races')
+    args = parser.parse_args()
+
+    workdir = scratch()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    sys.setswitchinterval(args.switch_interval)
+    # losing a contended word or repeating one from another connection is a
+    # rejection; lift the rejection budget so every submission is counted
+    game_server.REJECT_BURST = float('inf')
+    server = GameServer('127.0.0.1', 0)
+    server.timers.start()
+    failed = False
+    try:
+        for i in range(args.rounds):
+            errors, submissions, elapsed = run_round(server, args)
+            print(f'round {i + 1}: {submissions} submissions in {elapsed:.2f} s, '
+                  f'{"ok" if not errors else f"{len(errors)} errors"}')
+            for error in errors:
+                print(f'  {error}')
+            failed = failed or bool(errors)
+    finally:
+        server.server_socket.close()
+        server.timers.stop()
+        server.score_store.close()
+        server.credentials.close()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
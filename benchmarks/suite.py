@@ -0,0 +1,235 @@
+# python -m benchmarks.suite --json bench.json [--compare baseline.json]
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from anagrams import signature
+from data.words import WORDS
+from dictionary import solution_index
+from server import GameServer, Room, Session
+from storage import HASH_ITERATIONS, CredentialStore, ScoreStore
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPEAT = 5
+PLAYERS = (10_000, 100_000, 1_000_000)
+ACCOUNTS = (10_000, 100_000, 1_000_000)
+REGRESSION = 1.10  # slower than the baseline by more than this is flagged
+
+
+def measure(func, number: int, repeat: int = REPEAT) -> float:
+    # best of repeat runs in seconds per call; the minimum is the run the
+    # rest of the machine disturbed least, which is what makes it repeatable
+    func()
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def scratch() -> str:
+    # benchmarks write scores and accounts, keep them out of the repo's data/
+    workdir = tempfile.mkdtemp(prefix='anagrams-bench-')
+    shutil.copytree(os.path.join(REPO, 'data'), os.path.join(workdir, 'data'),
+                    ignore=shutil.ignore_patterns('scores.*', 'passwords.*', '__pycache__'))
+    return workdir
+
+
+class NullSession(Session):
+    # swallows frames, so only the server's own work is measured
+    def __init__(self, name: str):
+        super().__init__(('bench', 0))
+        self.name = name
+        self.sent = 0
+
+    def send(self, data: bytes):
+        self.sent += len(data)
+
+    def close(self):
+        pass
+
+
+def make_room(server: GameServer, players: int) -> Room:
+    room = Room('bench', server)
+    for i in range(players):
+        session = NullSession(f'player{i}')
+        room.add_client(session, session.name)
+        room.active_players[session.id] = session
+    return room
+
+
+def bench_words(server: GameServer) -> dict:
+    room = make_room(server, 2)
+    player = next(iter(room.active_players.values()))
+    reference = 'contribution'
+    room.game_started = True
+    room.current_word = reference
+    room.current_signature = signature(reference)
+    room.solutions = solution_index().get(reference)
+    submissions = ['bunion', 'tribute', 'contort', 'ruin', 'aaa', 'tonic', 'robin', 'zebra']
+    history = [word for word in room.solutions or WORDS][:50]
+    for word in history:
+        room.submit_word(player, word)
+
+    def run_check_word():
+        for word in submissions:
+            room.check_word(reference, word)
+
+    def run_is_valid_word():
+        for word in submissions:
+            room.is_valid_word(word)
+
+    def run_is_correct_word():
+        for word in submissions + history[:8]:
+            room.is_correct_word(word)
+
+    results = {
+        'room.check_word': measure(run_check_word, 20_000) / len(submissions),
+        'room.is_valid_word': measure(run_is_valid_word, 20_000) / len(submissions),
+        'room.is_correct_word': measure(run_is_correct_word, 20_000) / (len(submissions) + 8),
+    }
+    room.cancel_game()
+    return results
+
+
+def bench_broadcast(server: GameServer) -> dict:
+    results = {}
+    for players in (8, 100):
+        room = make_room(server, players)
+        scores = {f'player{i}': i for i in range(players)}
+
+        def run():
+            room.room_broadcast(msg_type='score', msg2_type='scores', msg=scores, all=False)
+
+        results[f'room.room_broadcast[{players} players]'] = measure(run, 2000 // players * 10)
+    return results
+
+
+def bench_table(server: GameServer, workdir: str, sizes) -> dict:
+    results = {}
+    server.clients = {session.id: session for session in (NullSession(f'client{i}') for i in range(10))}
+    first = next(iter(server.clients.values()))
+    for players in sizes:
+        path = os.path.join(workdir, f'scores-{players}.json')
+        with open(path, 'w') as file:
+            json.dump({f'player{i}': i % 1000 for i in range(players)}, file)
+
+        started = time.perf_counter()
+        store = ScoreStore(path, path + '.journal')
+        results[f'score_store.load[{players} players]'] = time.perf_counter() - started
+
+        server.score_store.close()
+        server.score_store = store
+
+        def run():
+            server.update_table('player0')
+
+        def run_send_table():
+            server.send_table(first)
+
+        number = max(1, 100_000 // players)
+        results[f'server.update_table[{players} players]'] = measure(run, number, 3)
+        results[f'server.send_table[{players} players]'] = measure(run_send_table, number, 3)
+        del store
+        gc.collect()
+    return results
+
+
+def bench_registration(workdir: str, sizes, iterations: int) -> dict:
+    results = {}
+    for accounts in sizes:
+        path = os.path.join(workdir, f'passwords-{accounts}.json')
+        log_path = path + '.log'
+        with open(path, 'w') as file:
+            json.dump({f'player{i}': f'secret{i}' for i in range(accounts)}, file)
+
+        started = time.perf_counter()
+        credentials = CredentialStore(path, log_path, iterations=iterations)
+        results[f'credentials.load[{accounts} accounts]'] = time.perf_counter() - started
+
+        name = f'player{accounts // 2}'
+        password = f'secret{accounts // 2}'
+        assert credentials.check(name, password)  # upgrades the plaintext record
+
+        def run():
+            credentials.check(name, password)
+
+        results[f'credentials.check[{accounts} accounts]'] = measure(run, 5, 3)
+        credentials.close()
+        del credentials
+        gc.collect()
+    return results
+
+
+def compare(results: dict, baseline: dict):
+    print(f'{"benchmark":45} {"baseline":>12} {"now":>12} {"ratio":>7}')
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        ratio = seconds / before
+        flag = '  slower' if ratio > REGRESSION else ''
+        print(f'{name:45} {before * 1e6:10.2f}us {seconds * 1e6:10.2f}us {ratio:6.2f}x{flag}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='microbenchmarks of the server hot paths')
+    parser.add_argument('--players', type=int, nargs='+', default=PLAYERS, help='scores.json sizes')
+    parser.add_argument('--accounts', type=int, nargs='+', default=ACCOUNTS, help='passwords.json sizes')
+    parser.add_argument('--hash-iterations', type=int, default=HASH_ITERATIONS)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results file of an earlier run to compare against')
+    args = parser.parse_args()
+
+    workdir = scratch()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    server = GameServer('127.0.0.1', 0)
+    try:
+        results = {}
+        results.update(bench_words(server))
+        results.update(bench_broadcast(server))
+        results.update(bench_table(server, workdir, args.players))
+        results.update(bench_registration(workdir, args.accounts, args.hash_iterations))
+    finally:
+        server.server_socket.close()
+        server.timers.stop()
+        server.score_store.close()
+        server.credentials.close()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{"benchmark":45} {"per call":>12}')
+    for name, seconds in results.items():
+        print(f'{name:45} {seconds * 1e6:10.2f}us')
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file)['results'])
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({
+                'commit': commit(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'config': vars(args),
+                'results': results,
+            }, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import asyncio
+import random
+import string
+import time
+from collections import Counter
+
+from dictionary import solution_index
+from protocol import RECV_SIZE, FrameDecoder, encode
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Stats:
+    # shared by every bot of a run
+    def __init__(self):
+        self.latencies = {}  # type: {str: [float]} # {command: [seconds]}
+        self.unanswered = Counter()  # type: {str: int} # requests without a reply before the timeout
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+
+    def record(self, command: str, seconds: float):
+        self.latencies.setdefault(command, []).append(seconds)
+
+    def summary(self) -> dict:
+        commands = {}
+        for command, values in sorted(self.latencies.items()):
+            commands[command] = {
+                'count': len(values),
+                'p50_ms': percentile(values, 50) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'max_ms': max(values) * 1000,
+                'unanswered': self.unanswered[command],
+            }
+        for command, count in self.unanswered.items():
+            commands.setdefault(command, {'count': 0, 'unanswered': count})
+        return {'commands': commands, 'sent': self.sent, 'received': self.received, 'errors': self.errors}
+
+
+class Bot:
+    # a headless player speaking the same protocol as client.py
+    def __init__(self, name: str, password: str, stats: Stats):
+        self.name = name
+        self.password = password
+        self.stats = stats
+
+        self.reader = None  # type: asyncio.StreamReader
+        self.writer = None  # type: asyncio.StreamWriter
+        self.decoder = FrameDecoder()
+        self.listener = None  # type: asyncio.Task
+
+        self.waiters = []  # type: [(callable, asyncio.Future)]
+        self.requests = {}  # type: {int: asyncio.Future} # {id: future} commands waiting for their reply
+        self.last_id = 0
+        self.word = ''
+        self.solutions = []  # type: [str]
+        self.score = 0
+        self.round_over = asyncio.Event()
+
+    async def connect(self, host: str, port: int):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.listener = asyncio.create_task(self.listen())
+
+    async def listen(self):
+        try:
+            while True:
+                data = await self.reader.read(RECV_SIZE)
+                if not data:
+                    break
+                for message in self.decoder.feed(data):
+                    self.stats.received += 1
+                    self.handle(message)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            print(f'{self.name} receive error {e}')
+            self.stats.errors += 1
+        finally:
+            for future in [future for _, future in self.waiters] + list(self.requests.values()):
+                if not future.done():
+                    future.cancel()
+            self.waiters.clear()
+            self.requests.clear()
+
+    def handle(self, message: dict):
+        if message['type'] == 'ping':
+            self.send({'command': 'pong'})
+        elif message['type'] == 'start':
+            self.word = message['word']
+            solutions = solution_index().get(self.word)
+            self.solutions = sorted(solutions) if solutions else []
+            self.round_over.clear()
+        elif message['type'] == 'end':
+            self.word = ''
+            self.round_over.set()
+        elif message['type'] == 'score':
+            # only the scores that changed, or a fresh table
+            if message.get('reset'):
+                self.score = 0
+            self.score = message['scores'].get(self.name, self.score)
+
+        future = self.requests.pop(message.get('id'), None)
+        if future is not None and not future.done():
+            future.set_result(message)
+
+        waiting = []
+        for accept, future in self.waiters:
+            if future.done():
+                continue
+            if accept(message):
+                future.set_result(message)
+            else:
+                waiting.append((accept, future))
+        self.waiters = waiting
+
+    def send(self, message: dict):
+        self.writer.write(encode(message))
+        self.stats.sent += 1
+
+    def expect(self, accept) -> asyncio.Future:
+        # resolves with the next message accept() agrees with
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append((accept, future))
+        return future
+
+    @staticmethod
+    async def wait(future: asyncio.Future, timeout: float):
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            return None
+
+    async def request(self, message: dict, timeout: float = 10.0):
+        # sends a command under a fresh id and times it until the reply
+        # carrying the id, any number of them can be in flight
+        self.last_id += 1
+        message['id'] = self.last_id
+        future = self.requests[self.last_id] = asyncio.get_running_loop().create_future()
+        started = time.perf_counter()
+        self.send(message)
+        try:
+            reply = await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.requests.pop(message['id'], None)
+            self.stats.unanswered[message['command']] += 1
+            return None
+        self.stats.record(message['command'], time.perf_counter() - started)
+        return reply
+
+    async def register(self):
+        return await self.request({'command': 'registration', 'name': self.name, 'password': self.password})
+
+    async def create_room(self, room: str):
+        reply = await self.request({'command': 'create_room', 'room': room})
+        return reply is not None and reply['type'] == 'created'
+
+    async def join_room(self, room: str):
+        reply = await self.request({'command': 'join_room', 'room': room})
+        return reply is not None and reply['type'] == 'joined'
+
+    async def start_game(self, room: str):
+        return await self.request({'command': 'start_game', 'room': room})
+
+    def pick_word(self, invalid_ratio: float) -> (str, bool):
+        # a word and whether it should score
+        if not self.solutions or random.random() < invalid_ratio:
+            return ''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 7))), False
+        return random.choice(self.solutions), True
+
+    async def submit_word(self, room: str, word: str, timeout: float = 5.0):
+        # answered with submitted, saying whether the word scored
+        return await self.request({'command': 'submit_word', 'room': room, 'word': word, 'player': self.name},
+                                  timeout)
+
+    async def close(self):
+        if self.writer:
+            try:
+                self.send({'command': 'exit'})
+                self.writer.close()
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        if self.listener:
+            self.listener.cancel()
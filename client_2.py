@@ -1,5 +1,5 @@
+import math
 import sys
-import pickle
 import socket
 import threading
 import time
@@ -8,12 +8,19 @@ from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton, QLabel,
     QLineEdit, QTableWidget, QTableWidgetItem, QGridLayout
 )
-from PyQt6.QtCore import pyqtSignal, QObject
+from PyQt6.QtCore import pyqtSignal, QObject, QTimer
+
+from protocol import FrameDecoder, encode, recv_messages
 
 
 HOST = '127.0.0.1'
 PORT = 65432
 
+COUNTDOWN_TEXT = {
+    'lobby': 'you have {} seconds to press start',
+    'round': 'you have {} seconds to submit words',
+}
+
 
 class Client(QObject):
     update_signal = pyqtSignal(dict)
@@ -24,12 +31,14 @@ class Client(QObject):
         self.port = port
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.connected = False
+        self.send_lock = threading.Lock()  # the listener answers pings while the window sends
 
         self.name = ''
 
     def client_connect(self):
         try:
             self.socket.connect((self.host, self.port))
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.connected = True
             threading.Thread(target=self.listen_to_server, daemon=True).start()
         except Exception as e:
@@ -37,19 +46,25 @@ class Client(QObject):
 
     def send(self, message):
         try:
-            self.socket.sendall(pickle.dumps(message))
+            with self.send_lock:
+                self.socket.sendall(encode(message))
         except Exception as e:
             print(f"Send error: {e}")
 
     def listen_to_server(self):
+        decoder = FrameDecoder()
         try:
             while self.connected:
                 try:
-                    data = self.socket.recv(1024)
-                    if not data:
+                    messages = recv_messages(self.socket, decoder)
+                    if messages is None:
                         break
-                    message = pickle.loads(data)
-                    self.update_signal.emit(message)
+                    for message in messages:
+                        if message['type'] == 'ping':
+                            # the server drops clients it doesn't hear from
+                            self.send({'command': 'pong'})
+                        else:
+                            self.update_signal.emit(message)
                 except Exception as e:
                     print(f"Receive error: {e}")
                     break
@@ -115,6 +130,7 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.client = client
         self.client.update_signal.connect(self.handle_server_message)
+        self.room_items = {}  # type: {str: QTableWidgetItem} # {room_name: name cell}
         self.init_ui()
         self.hidden = None
 
@@ -136,8 +152,8 @@ class MainWindow(QMainWindow):
         # self.layout.addWidget(self.score_table)
 
         self.room_table = QTableWidget()
-        self.room_table.setColumnCount(1)
-        self.room_table.setHorizontalHeaderLabels(['Rooms'])
+        self.room_table.setColumnCount(2)
+        self.room_table.setHorizontalHeaderLabels(['Rooms', 'Players'])
         self.table_grid.addWidget(self.room_table, 3, 1, 1, 1)
 
         self.layout.addLayout(self.table_grid)
@@ -180,6 +196,21 @@ class MainWindow(QMainWindow):
 
         self.info_label.setText('leaderboard')
 
+    def set_room(self, room: str, players: int):
+        item = self.room_items.get(room)
+        if item is None:
+            item = QTableWidgetItem(room)
+            self.room_items[room] = item
+            row = self.room_table.rowCount()
+            self.room_table.insertRow(row)
+            self.room_table.setItem(row, 0, item)
+        self.room_table.setItem(self.room_table.row(item), 1, QTableWidgetItem(str(players)))
+
+    def remove_room(self, room: str):
+        item = self.room_items.pop(room, None)
+        if item is not None:
+            self.room_table.removeRow(self.room_table.row(item))
+
     def create_room(self):
         room_name = self.room_input.text()
         if room_name:
@@ -213,12 +244,20 @@ class MainWindow(QMainWindow):
         if message["type"] == 'table':
             scores = message["message"]
             self.update_score_table(scores)
+            if 'rank' in message:
+                self.info_label.setText(f'leaderboard. you are #{message["rank"]} with {message["score"]}')
 
         if message['type'] == 'rooms':
-            rooms = message['message']
-            self.room_table.setRowCount(len(rooms))
-            for i, room in enumerate(rooms):
-                self.room_table.setItem(i, 0, QTableWidgetItem(room))
+            self.room_table.setRowCount(0)
+            self.room_items.clear()
+            for room, players in message['message'].items():
+                self.set_room(room, players)
+
+        if message['type'] in ('room_added', 'room_player_count'):
+            self.set_room(message['room'], message['players'])
+
+        if message['type'] == 'room_removed':
+            self.remove_room(message['room'])
 
     def exit(self):
         self.client.send({"command": "exit"})
@@ -233,6 +272,14 @@ class RoomWindow(QWidget):
         self.client.update_signal.connect(self.handle_server_message)
 
         self.in_game = False
+        self.score_items = {}  # type: {str: QTableWidgetItem} # {player: score cell}
+
+        # countdown to a deadline sent by the server, redrawn on the GUI thread
+        self.deadline = 0.0
+        self.countdown_phase = ''
+        self.countdown = QTimer(self)
+        self.countdown.setInterval(200)
+        self.countdown.timeout.connect(self.update_countdown)
 
         self.main_window = main_window
         self.central_widget = QWidget()
@@ -289,50 +336,63 @@ class RoomWindow(QWidget):
             self.client.send({"command": "submit_word", "room": self.name, "word": word, "player": self.client.name})
             self.word_input.clear()
 
-    def update_score_table(self, scores):
-        self.score_table.setRowCount(len(scores))
-        for i, (player, score) in enumerate(scores.items()):
-            self.score_table.setItem(i, 0, QTableWidgetItem(player))
-            self.score_table.setItem(i, 1, QTableWidgetItem(str(score)))
+    def update_score_table(self, scores: dict, reset: bool = False):
+        # scores only holds the players whose score changed
+        if reset:
+            self.score_table.setRowCount(0)
+            self.score_items.clear()
+        for player, score in scores.items():
+            item = self.score_items.get(player)
+            if item is None:
+                row = self.score_table.rowCount()
+                self.score_table.insertRow(row)
+                self.score_table.setItem(row, 0, QTableWidgetItem(player))
+                item = QTableWidgetItem()
+                self.score_items[player] = item
+                self.score_table.setItem(row, 1, item)
+            item.setText(str(score))
 
     def handle_server_message(self, message):
         if message["type"] == "start":
+            self.update_score_table({}, reset=True)
             self.info_label.setText('game started')
             self.submit_button.setEnabled(True)
             self.leave_button.setEnabled(False)
             self.start_button.setEnabled(False)
             self.word_label.setText(f"Current Word: {message['word']}")
+            self.start_countdown(message['deadline'], 'round')
 
         elif message["type"] == "info":
             self.info_label.setText(message["message"])
 
         elif message["type"] == 'timer':
-            seconds = int(message['message'])
-            threading.Thread(target=self.set_timer, args=(seconds,), daemon=True).start()
+            self.start_countdown(message['deadline'], 'lobby')
 
         elif message["type"] == "score":
-            self.update_score_table(message["scores"])
+            self.update_score_table(message["scores"], bool(message.get('reset')))
 
         elif message['type'] == 'end':
             self.in_game = False
-            self.info_label.setText('game over')
+            self.countdown.stop()
+            self.info_label.setText(message['message'])
             self.submit_button.setEnabled(False)
             self.leave_button.setEnabled(True)
             self.start_button.setEnabled(True)
 
-    def set_timer(self, seconds):
-        if seconds == 10:
-            for i in range(seconds - 1, -1, -1):
-                time.sleep(0.93)
-                if self.in_game:
-                    break
-                self.info_label.setText(f'you have {i} seconds to press start')
-        elif seconds == 60:
-            for i in range(seconds - 1, -1, -1):
-                time.sleep(0.96)
-                if not self.in_game:
-                    break
-                self.info_label.setText(f'you have {i} seconds to submit words')
+    def start_countdown(self, deadline: int, phase: str):
+        self.deadline = time.monotonic() + deadline / 1000
+        self.countdown_phase = phase
+        self.countdown.start()
+        self.update_countdown()
+
+    def update_countdown(self):
+        seconds = math.ceil(self.deadline - time.monotonic())
+        # the lobby countdown is for players who haven't pressed start yet,
+        # the round countdown for the ones playing
+        if seconds <= 0 or self.in_game != (self.countdown_phase == 'round'):
+            self.countdown.stop()
+            return
+        self.info_label.setText(COUNTDOWN_TEXT[self.countdown_phase].format(seconds))
 
     def leave_room(self):
         self.client.send({"command": "leave_room", "room": self.name})
@@ -0,0 +1,347 @@
+import argparse
+import bisect
+import functools
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+from threading import Lock
+
+from codec import JsonCodec
+from protocol import MAX_FRAME_SIZE, FrameDecoder, encode, recv_messages
+from server import (HOST, IDLE_TIMEOUT, LOBBY_TIME, PORT, ROUND_TIME, SCORE_TICK, SLOW_CLIENT_POLICIES,
+                    TABLE_SIZE, GameServer, Lobby, Session, SocketSession)
+from storage import HASH_ITERATIONS
+
+WORKERS = os.cpu_count() or 1
+RING_REPLICAS = 100  # points per worker on the hash ring
+HANDOFF_LIMIT = 64 * 1024  # largest session state a handover carries
+EVENTS_CODEC = JsonCodec()
+MAX_EVENT_SIZE = MAX_FRAME_SIZE
+ROUTED_COMMANDS = ('registration', 'create_room', 'join_room')  # only the front door handles these
+
+
+class HashRing:
+    # consistent hashing of room names onto workers. every worker owns many
+    # points so rooms spread evenly, and a different worker count only moves
+    # the rooms next to the points that changed
+    def __init__(self, nodes, replicas: int = RING_REPLICAS):
+        points = sorted((self.hash(f'{node}:{i}'), node) for node in nodes for i in range(replicas))
+        self.keys = [key for key, _ in points]
+        self.nodes = [node for _, node in points]
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+    def get(self, key: str):
+        return self.nodes[bisect.bisect(self.keys, self.hash(key)) % len(self.keys)]
+
+
+class Link:
+    # the two unix socket pairs between the front door and one worker.
+    # channel is seqpacket and carries client sockets together with their
+    # session state, one handover per packet. events is a stream of json
+    # frames with lobby and leaderboard updates
+    def __init__(self, channel: socket.socket, events: socket.socket, process: subprocess.Popen = None):
+        self.channel = channel
+        self.events = events
+        self.process = process
+        self.lock = Lock()  # serializes writes to events
+
+    def send(self, event: dict):
+        with self.lock:
+            self.events.sendall(encode(event, EVENTS_CODEC))
+
+    def hand_over(self, session: SocketSession, **fields) -> bool:
+        # the session stops here and continues on the other end of the
+        # channel; the client is dropped if that fails
+        sock = session.detach()
+        if sock is None:
+            return False
+        try:
+            state = json.dumps({'name': session.name, 'backlog': list(session.backlog),
+                                'buffered': session.decoder.pending().hex(), **fields}).encode()
+            if len(state) > HANDOFF_LIMIT:
+                raise ValueError(f'{len(state)} bytes of session state')
+            socket.send_fds(self.channel, [state], [sock.fileno()])
+        except (OSError, ValueError) as e:
+            print(f'could not hand over {session.address}: {e}')
+            return False
+        finally:
+            sock.close()
+        return True
+
+    def receive_sessions(self, adopt):
+        # adopt(sock, state) for every handed over socket until the other end closes
+        while True:
+            state, fds, _, _ = socket.recv_fds(self.channel, HANDOFF_LIMIT, 1)
+            if not state and not fds:
+                break
+            for fd in fds:
+                sock = socket.socket(fileno=fd)
+                try:
+                    adopt(sock, json.loads(state))
+                except Exception as e:
+                    print(f'could not take over a session: {e}')
+                    sock.close()
+
+    def receive_events(self, handle):
+        decoder = FrameDecoder(MAX_EVENT_SIZE, EVENTS_CODEC)
+        try:
+            while True:
+                events = recv_messages(self.events, decoder)
+                if events is None:
+                    break
+                for event in events:
+                    handle(event)
+        except OSError:
+            pass
+
+    def close(self):
+        for sock in (self.channel, self.events):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        if self.process:
+            try:
+                self.process.wait(5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class RemoteLobby(Lobby):
+    # the rooms live in the workers, the front door only knows the player
+    # counts they report
+    def __init__(self, server: 'FrontDoor', window: float = 0.05):
+        super().__init__(server, window)
+        self.counts = {}  # type: {str: int} # {room_name: players}
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.counts)
+
+    def players(self, name: str):
+        return self.counts.get(name)
+
+    def update(self, rooms: dict):
+        with self.lock:
+            for name, players in rooms.items():
+                if players is None:
+                    self.counts.pop(name, None)
+                else:
+                    self.counts[name] = players
+        for name in rooms:
+            self.touch(name)
+
+
+class ShardLobby(Lobby):
+    # a worker doesn't talk to the lobby's clients, it reports its room
+    # counts to the front door which does
+    def flush(self):
+        with self.lock:
+            touched, self.touched = self.touched, set()
+        try:
+            self.server.link.send({'event': 'rooms', 'rooms': {name: self.players(name) for name in touched}})
+        except OSError as e:
+            print(f'could not report rooms {e}')
+
+
+class FrontDoor(GameServer):
+    # accepts every connection and handles registration and the lobby. a
+    # client that creates or joins a room is handed over, socket and all, to
+    # the worker process the ring assigns the room to, and comes back here
+    # when it leaves. the front door owns the scores, workers report wins
+    def __init__(self, host, port, workers: int = WORKERS, **options):
+        super().__init__(host, port, **options)
+        self.lobby = RemoteLobby(self)
+        self.ring = HashRing(range(workers))
+        self.workers = workers
+        self.links = []  # type: [Link]
+        self.ready = threading.Semaphore(0)  # released once per worker done loading the dictionary
+
+    def spawn(self, index: int) -> Link:
+        channel, worker_channel = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        events, worker_events = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        fds = (worker_channel.fileno(), worker_events.fileno())
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--worker', str(index),
+             '--channel-fd', str(fds[0]), '--events-fd', str(fds[1]), '--slow-clients', self.slow_client_policy,
+             '--lobby-time', str(self.lobby_time), '--round-time', str(self.round_time),
+             '--score-tick', str(self.score_tick), '--idle-timeout', str(self.idle_timeout)],
+            pass_fds=fds)
+        worker_channel.close()
+        worker_events.close()
+        return Link(channel, events, process)
+
+    def handle_message(self, session: Session, message: dict):
+        if message.get('command') in ('create_room', 'join_room'):
+            return self.route(session, message)
+        return super().handle_message(session, message)
+
+    def route(self, session: SocketSession, message: dict):
+        link = self.links[self.ring.get(message['room'])]
+        self.forget(session)
+        link.hand_over(session, command=message)
+
+    def adopt(self, sock: socket.socket, state: dict):
+        # a client back from a worker. it missed the lobby while it was away
+        session = self.add_session(sock, sock.getpeername(), state['name'], state['backlog'],
+                                   bytes.fromhex(state['buffered']))
+        if session.name:
+            self.clients_with_name[session.id] = session
+            self.send_table(session)
+            self.send_rooms(session)
+        self.serve(session)
+
+    def handle_event(self, link: Link, event: dict):
+        if event['event'] == 'ready':
+            self.ready.release()
+        elif event['event'] == 'rooms':
+            self.lobby.update(event['rooms'])
+        elif event['event'] == 'win':
+            # ranks live here, the worker the round was played on gets its
+            # players' along with the table
+            self.score_store.increment(event['name'])
+            ranks = {name: self.score_store.rank(name) for name in event['players']}
+            self.broadcast_table(self.score_store.top(TABLE_SIZE), origin=link, ranks=ranks)
+
+    def broadcast_table(self, table: dict, skip=(), origin: Link = None, ranks: dict = None):
+        super().broadcast_table(table, skip)
+        for link in self.links:
+            event = {'event': 'table', 'table': table}
+            if link is origin:
+                event['ranks'] = ranks
+            try:
+                link.send(event)
+            except OSError as e:
+                print(f'could not send the table to a worker {e}')
+
+    def start(self):
+        self.links = [self.spawn(index) for index in range(self.workers)]
+        for link in self.links:
+            threading.Thread(target=link.receive_sessions, args=(self.adopt,), daemon=True).start()
+            threading.Thread(target=link.receive_events, args=(functools.partial(self.handle_event, link),),
+                             daemon=True).start()
+        for _ in self.links:
+            self.ready.acquire(timeout=30)
+        try:
+            super().start()
+        finally:
+            for link in self.links:
+                link.close()
+
+
+class WorkerServer(GameServer):
+    # plays the rooms the ring assigns to this worker. it has no listening
+    # socket and no stores: clients arrive over the link, wins go back over it
+    def __init__(self, index: int, link: Link, **options):
+        self.index = index
+        self.link = link
+        self.top = {}  # type: {str: int} # the top of the leaderboard as last sent by the front door
+        super().__init__(None, None, **options)
+        self.lobby = ShardLobby(self)
+
+    def listen(self):
+        return None
+
+    def open_stores(self, hash_iterations: int):
+        pass
+
+    def adopt(self, sock: socket.socket, state: dict):
+        session = self.add_session(sock, sock.getpeername(), state['name'], state['backlog'],
+                                   bytes.fromhex(state['buffered']))
+        GameServer.handle_message(self, session, state['command'])
+        if session.room is None:
+            # the room it asked for doesn't exist (here)
+            self.hand_back(session)
+        else:
+            self.serve(session)
+
+    def handle_message(self, session: Session, message: dict):
+        command = message.get('command')
+        if command in ROUTED_COMMANDS:
+            self.leave_room(session)
+            session.backlog.appendleft(message)
+            return self.hand_back(session)
+
+        super().handle_message(session, message)
+        if session.room is None and command != 'exit':
+            self.hand_back(session)
+
+    def hand_back(self, session: SocketSession):
+        self.forget(session)
+        self.link.hand_over(session)
+
+    def update_table(self, client_name: str, players=()):
+        try:
+            self.link.send({'event': 'win', 'name': client_name, 'players': [client.name for client in players]})
+        except OSError as e:
+            print(f'could not report the win of {client_name} {e}')
+
+    def handle_event(self, event: dict):
+        if event['event'] == 'table':
+            # the round's players, when the round was played here, get the
+            # table with their rank instead
+            self.top = event['table']
+            ranks = event.get('ranks') or {}
+            players = [client for client in list(self.clients.values()) if client.name in ranks]
+            self.broadcast_table(self.top, skip={client.id for client in players})
+            for client in players:
+                self.send_table(client, *ranks[client.name])
+
+    def send_table(self, client: Session, rank: int = None, score: int = None):
+        try:
+            client.send(encode({'type': 'table', 'message': self.top, 'rank': rank, 'score': score}))
+        except Exception as e:
+            print(f'error with {client} with exception {e}')
+
+    def start(self):
+        self.timers.start()
+        threading.Thread(target=self.link.receive_events, args=(self.handle_event,), daemon=True).start()
+        self.link.send({'event': 'ready'})
+        try:
+            # returns once the front door is gone
+            self.link.receive_sessions(self.adopt)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.timers.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Anagrams game server sharded over worker processes')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--slow-clients', choices=SLOW_CLIENT_POLICIES, default='disconnect',
+                        help='what to do with a client whose outbound queue is full')
+    parser.add_argument('--lobby-time', type=float, default=LOBBY_TIME)
+    parser.add_argument('--round-time', type=float, default=ROUND_TIME)
+    parser.add_argument('--score-tick', type=float, default=SCORE_TICK,
+                        help='seconds over which score changes are batched')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='seconds of silence after which a client is dropped, it is pinged after a third')
+    parser.add_argument('--hash-iterations', type=int, default=HASH_ITERATIONS,
+                        help='pbkdf2 work factor for stored passwords')
+    # set by the front door when it starts a worker
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--channel-fd', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--events-fd', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is None:
+        server = FrontDoor(args.host, args.port, workers=args.workers, slow_client_policy=args.slow_clients,
+                           lobby_time=args.lobby_time, round_time=args.round_time, score_tick=args.score_tick,
+                           idle_timeout=args.idle_timeout, hash_iterations=args.hash_iterations)
+    else:
+        link = Link(socket.socket(fileno=args.channel_fd), socket.socket(fileno=args.events_fd))
+        server = WorkerServer(args.worker, link, slow_client_policy=args.slow_clients,
+                              lobby_time=args.lobby_time, round_time=args.round_time, score_tick=args.score_tick,
+                              idle_timeout=args.idle_timeout)
+    server.start()
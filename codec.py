@@ -0,0 +1,271 @@
+import json
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for MsgpackCodec
+    msgpack = None
+
+
+class CodecError(Exception):
+    pass
+
+
+# field kinds
+STR = 'str'
+INT = 'int'
+COUNTS = 'counts'  # {str: int}, e.g. scores or rooms with their player counts
+
+# (tag, key, name, fields). client commands carry their name under 'command',
+# server messages under 'type'. tags are part of the wire format: never reuse
+# or renumber one, only append. deadlines are milliseconds from the moment
+# the message was sent. a score message only carries the scores that
+# changed, unless reset is set the client keeps the ones it has. any command
+# may carry an id, the server's direct replies to it echo the id back;
+# submit_word is only answered, with submitted, when it has one
+MESSAGES = (
+    (1, 'command', 'registration', (('name', STR), ('password', STR), ('id', INT))),
+    (2, 'command', 'create_room', (('room', STR), ('id', INT))),
+    (3, 'command', 'join_room', (('room', STR), ('id', INT))),
+    (4, 'command', 'leave_room', (('room', STR), ('id', INT))),
+    (5, 'command', 'start_game', (('room', STR), ('id', INT))),
+    (6, 'command', 'submit_word', (('room', STR), ('word', STR), ('player', STR), ('id', INT))),
+    (7, 'command', 'exit', (('id', INT),)),
+    (8, 'command', 'ping', (('id', INT),)),
+    (9, 'command', 'pong', (('id', INT),)),
+
+    (32, 'type', 'registration', (('message', STR), ('id', INT))),
+    (33, 'type', 'created', (('message', STR), ('id', INT))),
+    (34, 'type', 'joined', (('message', STR), ('id', INT))),
+    (35, 'type', 'info', (('message', STR), ('id', INT))),
+    (36, 'type', 'rooms', (('message', COUNTS), ('id', INT))),
+    (37, 'type', 'room_added', (('room', STR), ('players', INT), ('id', INT))),
+    (38, 'type', 'room_removed', (('room', STR), ('id', INT))),
+    (39, 'type', 'room_player_count', (('room', STR), ('players', INT), ('id', INT))),
+    (40, 'type', 'table', (('message', COUNTS), ('rank', INT), ('score', INT), ('id', INT))),
+    (41, 'type', 'score', (('scores', COUNTS), ('reset', INT), ('id', INT))),
+    (42, 'type', 'timer', (('message', STR), ('deadline', INT), ('id', INT))),
+    (43, 'type', 'start', (('word', STR), ('deadline', INT), ('id', INT))),
+    (44, 'type', 'end', (('message', STR), ('id', INT))),
+    (45, 'type', 'ping', (('id', INT),)),
+    (46, 'type', 'pong', (('id', INT),)),
+    (47, 'type', 'submitted', (('word', STR), ('scored', INT), ('id', INT))),
+)
+
+
+def write_varint(out: bytearray, value: int):
+    if value < 0x80:
+        out.append(value)
+        return
+    if value < 0x4000:
+        out.append(value & 0x7f | 0x80)
+        out.append(value >> 7)
+        return
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset: int) -> (int, int):
+    byte = data[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+    second = data[offset + 1]
+    if second < 0x80:
+        return byte & 0x7f | second << 7, offset + 2
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def write_str(out: bytearray, value: str):
+    encoded = value.encode()
+    if len(encoded) < 0x80:
+        out.append(len(encoded))
+    else:
+        write_varint(out, len(encoded))
+    out += encoded
+
+
+def read_str(data: bytes, offset: int) -> (str, int):
+    length = data[offset]
+    if length < 0x80:
+        offset += 1
+    else:
+        length, offset = read_varint(data, offset)
+    end = offset + length
+    if end > len(data):
+        raise CodecError('string runs past the end of the message')
+    return data[offset:end].decode(), end
+
+
+def write_int(out: bytearray, value: int):
+    # zigzag, so small negative numbers stay short
+    value = value << 1 if value >= 0 else (-value << 1) - 1
+    if value < 0x80:
+        out.append(value)
+    else:
+        write_varint(out, value)
+
+
+def read_int(data: bytes, offset: int) -> (int, int):
+    value = data[offset]
+    if value < 0x80:
+        offset += 1
+    else:
+        value, offset = read_varint(data, offset)
+    return (value >> 1) ^ -(value & 1), offset
+
+
+def write_counts(out: bytearray, value: dict):
+    # write_str and write_int inlined for the common short name and small count
+    write_varint(out, len(value))
+    for name, count in value.items():
+        encoded = name.encode()
+        if len(encoded) < 0x80:
+            out.append(len(encoded))
+        else:
+            write_varint(out, len(encoded))
+        out += encoded
+        count = count << 1 if count >= 0 else (-count << 1) - 1
+        if count < 0x80:
+            out.append(count)
+        else:
+            write_varint(out, count)
+
+
+def read_counts(data: bytes, offset: int) -> (dict, int):
+    # read_str and read_int inlined, tables and room lists are the biggest messages
+    size, offset = read_varint(data, offset)
+    value = {}
+    for _ in range(size):
+        length = data[offset]
+        if length < 0x80:
+            offset += 1
+        else:
+            length, offset = read_varint(data, offset)
+        end = offset + length
+        if end > len(data):
+            raise CodecError('string runs past the end of the message')
+        name = data[offset:end].decode()
+        count = data[end]
+        if count < 0x80:
+            offset = end + 1
+        else:
+            count, offset = read_varint(data, end)
+        value[name] = (count >> 1) ^ -(count & 1)
+    return value, offset
+
+
+WRITERS = {STR: write_str, INT: write_int, COUNTS: write_counts}
+READERS = {STR: read_str, INT: read_int, COUNTS: read_counts}
+
+
+class BinaryCodec:
+    # tag byte, varint bitmap of the fields that follow, then the fields in
+    # schema order. nothing but the schema's plain values can be decoded
+    name = 'binary'
+
+    def __init__(self, messages=MESSAGES):
+        # the field bits, names and their reader or writer resolved once per
+        # message, not per field on every call
+        self.by_name = {}  # type: {(str, str): (int, tuple)} # {(key, name): (tag, ((bit, field, writer), ...))}
+        self.by_tag = {}  # type: {int: (str, str, tuple)} # {tag: (key, name, ((bit, field, reader), ...))}
+        for tag, key, name, fields in messages:
+            self.by_name[key, name] = (tag, tuple((1 << i, field, WRITERS[kind])
+                                                  for i, (field, kind) in enumerate(fields)))
+            self.by_tag[tag] = (key, name, tuple((1 << i, field, READERS[kind])
+                                                 for i, (field, kind) in enumerate(fields)))
+
+    def encode(self, message: dict) -> bytes:
+        key = 'command' if 'command' in message else 'type'
+        spec = self.by_name.get((key, message.get(key)))
+        if spec is None:
+            raise CodecError(f'no schema for {key} {message.get(key)!r}')
+        tag, fields = spec
+
+        present = 0
+        body = bytearray()
+        for bit, field, write in fields:
+            value = message.get(field)
+            if value is not None:
+                present |= bit
+                write(body, value)
+
+        if present < 0x80:
+            return bytes((tag, present)) + body
+        out = bytearray((tag,))
+        write_varint(out, present)
+        out += body
+        return bytes(out)
+
+    def decode(self, data) -> dict:
+        # one copy out of the receive buffer, bytes slice and decode faster
+        # than memoryviews
+        data = bytes(data)
+        try:
+            spec = self.by_tag.get(data[0])
+            if spec is None:
+                raise CodecError(f'unknown message tag {data[0]}')
+            key, name, fields = spec
+
+            message = {key: name}
+            present = data[1]
+            if present < 0x80:
+                offset = 2
+            else:
+                present, offset = read_varint(data, 1)
+            for bit, field, read in fields:
+                if present & bit:
+                    message[field], offset = read(data, offset)
+        except (IndexError, UnicodeDecodeError) as e:
+            raise CodecError(f'malformed message: {e}') from e
+
+        if offset != len(data):
+            raise CodecError('trailing bytes after message')
+        return message
+
+
+class JsonCodec:
+    name = 'json'
+
+    def encode(self, message: dict) -> bytes:
+        return json.dumps(message, separators=(',', ':')).encode()
+
+    def decode(self, data) -> dict:
+        try:
+            message = json.loads(bytes(data))
+        except ValueError as e:
+            raise CodecError(f'malformed message: {e}') from e
+        if not isinstance(message, dict):
+            raise CodecError('message is not an object')
+        return message
+
+
+class MsgpackCodec:
+    name = 'msgpack'
+
+    def __init__(self):
+        if msgpack is None:
+            raise CodecError('msgpack is not installed')
+
+    def encode(self, message: dict) -> bytes:
+        return msgpack.packb(message)
+
+    def decode(self, data) -> dict:
+        try:
+            message = msgpack.unpackb(data)
+        except (ValueError, msgpack.ExtraData) as e:
+            raise CodecError(f'malformed message: {e}') from e
+        if not isinstance(message, dict):
+            raise CodecError('message is not a map')
+        return message
+
+
+CODECS = {codec.name: codec for codec in (BinaryCodec, JsonCodec, MsgpackCodec)}
@@ -1,44 +1,55 @@
+import random
+
+_WORDS = [
+    "absolute", "abundance", "achievement", "adventure", "alternative", "appreciate", "appropriate",
+    "articulate", "assistance", "believable", "beautiful", "brilliant", "calculation", "celebration",
+    "courageous", "definitely", "delicious", "determined", "diplomatic", "discover", "elevation",
+    "encourage", "exclusive", "experience", "forgiveness", "freedom", "generosity", "harmony", "imagine",
+    "important", "independent", "inspiration", "integrity", "intelligence", "investment", "knowledge",
+    "laughter", "liberation", "mysterious", "optimistic", "perfection", "reliable", "respectful",
+    "significant", "solution", "strength", "successful", "together", "understand", "vibrations",
+    "vulnerable", "wonderful", "achievements", "admirable", "attractive", "courage", "determination",
+    "discoveries", "education", "encouragement", "evaluation", "excellence", "exciting", "fantastic",
+    "forgiving", "friendship", "impressive", "incredible", "inspirational", "intellectual", "imagination",
+    "investments", "justified", "knowledgeable", "leadership", "liberating", "luminous", "motivational",
+    "motivated", "nourishment", "permanent", "practical", "reliable", "reputation", "resourceful",
+    "satisfaction", "spiritual", "substantial", "successful", "supportive", "surprising", "trustworthy",
+    "unfortunate", "understanding", "valuable", "vibrantly", "visionary", "welcoming", "wonderful",
+    "appreciation", "artistic", "aspiration", "beautifully", "celebration", "courageously", "definitely",
+    "enthusiasm", "evaluation", "expressive", "fascinated", "forgiveness", "friendliness", "goodness",
+    "gratefulness", "involvement", "importance", "intention", "laughter", "leadership", "longevity",
+    "meaningful", "motivated", "positivity", "practicality", "reflection", "resourceful", "respectful",
+    "sensitive", "spirituality", "strengthen", "supportive", "understanding", "welcoming", "wisdom",
+    "appreciated", "attentive", "balanced", "beautifully", "beneficiary", "brilliantly", "comfortably",
+    "completely", "compassionate", "contribution", "discovery", "enlighten", "empowered", "excellence",
+    "exciting", "faithfully", "fantastic", "forwardly", "generous", "inspired", "knowledge", "leadership",
+    "logical", "manageable", "nourishing", "overcome", "passionate", "perspective", "realistic", "resilience",
+    "reliable", "resourceful", "sustainable", "successfully", "strengthening", "trustworthy", "unconventional",
+    "valuable", "wonderfully", "adaptable", "appreciated", "brilliance", "carefully", "carelessness", "character",
+    "concentration", "comfortably", "diversity", "encouraging", "expectations", "expression", "forward",
+    "gracefulness", "hardworking", "hopefulness", "inspiration", "involvement", "lifestyle", "listening",
+    "meaningful", "motivational", "optimistic", "outstanding", "persuasive", "respectful", "sincerity",
+    "successful", "unbelievable", "unfamiliar", "vibrantly", "wholesome", "admirable", "appreciation",
+    "adventurous", "advisable", "affirmative", "ambitious", "appealing", "associated", "attraction",
+    "beneficial", "committed", "conservative", "decisive", "delightful", "dependable", "detachable",
+    "distinguished", "exemplary", "incredible", "intelligent", "inviting", "motivating", "negotiable",
+    "outstanding", "pleasing", "relevant", "resilience", "significant", "solution", "successful", "surprising",
+    "visionary", "welcoming", "wonderfully", "amazing", "artistic", "attention", "brilliant", "courage",
+    "dedicated", "energetic", "exclusive", "explanatory", "motivating", "reflective", "respectful", "resourceful",
+    "significant", "sustainable", "trustworthy", "valuable", "witnessed", "wonderful", "acceleration",
+    "adoptive", "advancement", "affirmative", "altruistic", "applicable", "assertiveness", "attention",
+    "availability", "benefit", "caring", "celebratory", "consistency", "contribution", "cooperation",
+    "encouragement", "excellence", "generosity", "honorable", "inclusive", "impressive", "optimistic",
+    "productive", "reliable", "reputation", "significance", "steadfast", "successful", "supportive", "together"
+]
+
+# the corpus is deduplicated once and shared by every room
+WORDS = tuple(dict.fromkeys(_WORDS))
+
+
+def random_word() -> str:
+    return random.choice(WORDS)
+
+
 class Words:
-    def __init__(self):
-        self.words = [
-            "absolute", "abundance", "achievement", "adventure", "alternative", "appreciate", "appropriate",
-            "articulate", "assistance", "believable", "beautiful", "brilliant", "calculation", "celebration",
-            "courageous", "definitely", "delicious", "determined", "diplomatic", "discover", "elevation",
-            "encourage", "exclusive", "experience", "forgiveness", "freedom", "generosity", "harmony", "imagine",
-            "important", "independent", "inspiration", "integrity", "intelligence", "investment", "knowledge",
-            "laughter", "liberation", "mysterious", "optimistic", "perfection", "reliable", "respectful",
-            "significant", "solution", "strength", "successful", "together", "understand", "vibrations",
-            "vulnerable", "wonderful", "achievements", "admirable", "attractive", "courage", "determination",
-            "discoveries", "education", "encouragement", "evaluation", "excellence", "exciting", "fantastic",
-            "forgiving", "friendship", "impressive", "incredible", "inspirational", "intellectual", "imagination",
-            "investments", "justified", "knowledgeable", "leadership", "liberating", "luminous", "motivational",
-            "motivated", "nourishment", "permanent", "practical", "reliable", "reputation", "resourceful",
-            "satisfaction", "spiritual", "substantial", "successful", "supportive", "surprising", "trustworthy",
-            "unfortunate", "understanding", "valuable", "vibrantly", "visionary", "welcoming", "wonderful",
-            "appreciation", "artistic", "aspiration", "beautifully", "celebration", "courageously", "definitely",
-            "enthusiasm", "evaluation", "expressive", "fascinated", "forgiveness", "friendliness", "goodness",
-            "gratefulness", "involvement", "importance", "intention", "laughter", "leadership", "longevity",
-            "meaningful", "motivated", "positivity", "practicality", "reflection", "resourceful", "respectful",
-            "sensitive", "spirituality", "strengthen", "supportive", "understanding", "welcoming", "wisdom",
-            "appreciated", "attentive", "balanced", "beautifully", "beneficiary", "brilliantly", "comfortably",
-            "completely", "compassionate", "contribution", "discovery", "enlighten", "empowered", "excellence",
-            "exciting", "faithfully", "fantastic", "forwardly", "generous", "inspired", "knowledge", "leadership",
-            "logical", "manageable", "nourishing", "overcome", "passionate", "perspective", "realistic", "resilience",
-            "reliable", "resourceful", "sustainable", "successfully", "strengthening", "trustworthy", "unconventional",
-            "valuable", "wonderfully", "adaptable", "appreciated", "brilliance", "carefully", "carelessness", "character",
-            "concentration", "comfortably", "diversity", "encouraging", "expectations", "expression", "forward",
-            "gracefulness", "hardworking", "hopefulness", "inspiration", "involvement", "lifestyle", "listening",
-            "meaningful", "motivational", "optimistic", "outstanding", "persuasive", "respectful", "sincerity",
-            "successful", "unbelievable", "unfamiliar", "vibrantly", "wholesome", "admirable", "appreciation",
-            "adventurous", "advisable", "affirmative", "ambitious", "appealing", "associated", "attraction",
-            "beneficial", "committed", "conservative", "decisive", "delightful", "dependable", "detachable",
-            "distinguished", "exemplary", "incredible", "intelligent", "inviting", "motivating", "negotiable",
-            "outstanding", "pleasing", "relevant", "resilience", "significant", "solution", "successful", "surprising",
-            "visionary", "welcoming", "wonderfully", "amazing", "artistic", "attention", "brilliant", "courage",
-            "dedicated", "energetic", "exclusive", "explanatory", "motivating", "reflective", "respectful", "resourceful",
-            "significant", "sustainable", "trustworthy", "valuable", "witnessed", "wonderful", "acceleration",
-            "adoptive", "advancement", "affirmative", "altruistic", "applicable", "assertiveness", "attention",
-            "availability", "benefit", "caring", "celebratory", "consistency", "contribution", "cooperation",
-            "encouragement", "excellence", "generosity", "honorable", "inclusive", "impressive", "optimistic",
-            "productive", "reliable", "reputation", "significance", "steadfast", "successful", "supportive", "together"
-        ]
+    words = WORDS
@@ -0,0 +1,127 @@
+import mmap
+import os
+import struct
+from threading import Lock
+
+from anagrams import signature
+from data.words import WORDS
+
+# lowercase words of two or more letters from Webster's Second International
+# (the public domain web2 list shipped with BSD)
+DICTIONARY_PATH = 'data/dictionary.txt'
+
+_words = None  # type: frozenset
+_lock = Lock()
+
+
+def load_dictionary(path: str = DICTIONARY_PATH) -> frozenset:
+    with open(path, 'r') as file:
+        return frozenset(file.read().split())
+
+
+def dictionary() -> frozenset:
+    # loaded on first use and shared by every room in the process
+    global _words
+    if _words is None:
+        with _lock:
+            if _words is None:
+                _words = load_dictionary()
+    return _words
+
+
+def is_word(word: str) -> bool:
+    return word in dictionary()
+
+
+# every source word from data/words.py with all dictionary words that can be
+# built from its letters, written by `python dictionary.py`
+SOLUTIONS_PATH = 'data/solutions.idx'
+SOLUTIONS_MAGIC = b'ANAG'
+SOLUTIONS_HEADER = struct.Struct('!4sI')  # magic, number of entries
+SOLUTIONS_ENTRY = struct.Struct('!IIII')  # word offset, word length, solutions offset, solutions length
+
+_solutions = None  # type: SolutionIndex
+
+
+def build_solutions(sources, words) -> dict:
+    by_signature = {}  # type: {int: [str]}
+    for word in words:
+        by_signature.setdefault(signature(word), []).append(word)
+
+    solutions = {}  # type: {str: [str]}
+    for source in sources:
+        reference = signature(source)
+        found = []
+        for word_signature, group in by_signature.items():
+            if word_signature and reference % word_signature == 0:
+                found.extend(group)
+        solutions[source] = sorted(found)
+    return solutions
+
+
+def write_solutions(path: str, solutions: dict):
+    # header, then a fixed size directory, then the words and their
+    # newline separated solutions as utf-8
+    blobs = []
+    for source, words in sorted(solutions.items()):
+        blobs.append((source.encode(), '\n'.join(words).encode()))
+
+    offset = SOLUTIONS_HEADER.size + SOLUTIONS_ENTRY.size * len(blobs)
+    directory = []
+    for source, words in blobs:
+        directory.append(SOLUTIONS_ENTRY.pack(offset, len(source), offset + len(source), len(words)))
+        offset += len(source) + len(words)
+
+    with open(path, 'wb') as file:
+        file.write(SOLUTIONS_HEADER.pack(SOLUTIONS_MAGIC, len(blobs)))
+        file.writelines(directory)
+        for source, words in blobs:
+            file.write(source)
+            file.write(words)
+
+
+class SolutionIndex:
+    def __init__(self, path: str = SOLUTIONS_PATH):
+        self.entries = {}  # type: {str: (int, int)} # {source word: (offset, length)}
+        self.map = None  # type: mmap.mmap
+
+        if not os.path.exists(path):
+            print(f'{path} is missing, run `python dictionary.py` to build it')
+            return
+
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count = SOLUTIONS_HEADER.unpack_from(self.map)
+        if magic != SOLUTIONS_MAGIC:
+            raise ValueError(f'{path} is not a solution index')
+
+        for i in range(count):
+            word_offset, word_length, offset, length = SOLUTIONS_ENTRY.unpack_from(
+                self.map, SOLUTIONS_HEADER.size + i * SOLUTIONS_ENTRY.size)
+            word = self.map[word_offset:word_offset + word_length].decode()
+            self.entries[word] = (offset, length)
+
+    def get(self, word: str):
+        # None when the word is not indexed
+        entry = self.entries.get(word)
+        if entry is None:
+            return None
+        offset, length = entry
+        if not length:
+            return frozenset()
+        return frozenset(self.map[offset:offset + length].decode().split('\n'))
+
+
+def solution_index() -> SolutionIndex:
+    global _solutions
+    if _solutions is None:
+        with _lock:
+            if _solutions is None:
+                _solutions = SolutionIndex()
+    return _solutions
+
+
+if __name__ == '__main__':
+    write_solutions(SOLUTIONS_PATH, build_solutions(WORDS, dictionary()))
+    print(f'wrote {SOLUTIONS_PATH}')
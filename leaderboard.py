@@ -0,0 +1,87 @@
+import bisect
+
+
+class Leaderboard:
+    # players bucketed by score, plus a fenwick tree over the scores counting
+    # the players on each. moving a player and looking up a rank are
+    # O(log s) in the highest score, and the top of the board is read off
+    # the highest buckets without sorting anybody. ties rank equal and are
+    # listed in the order the players reached the score
+    def __init__(self, scores: dict = None):
+        self.buckets = {}  # type: {int: {str: None}} # {score: players in the order they got there}
+        self.levels = []  # type: [int] # scores with at least one player, ascending
+        self.tree = [0]  # fenwick tree, tree[score + 1] onwards
+        self.players = 0
+
+        counts = {}
+        for name, score in (scores or {}).items():
+            bucket = self.buckets.get(score)
+            if bucket is None:
+                bucket = self.buckets[score] = {}
+            bucket[name] = None
+            counts[score] = counts.get(score, 0) + 1
+        self.levels = sorted(self.buckets)
+        self.players = len(scores or ())
+        self.build(max(self.levels, default=0) + 1, counts)
+
+    def build(self, size: int, counts: dict):
+        # linear fenwick construction from per score counts
+        tree = [0] * (size + 1)
+        for score, count in counts.items():
+            tree[score + 1] = count
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add(self, score: int, delta: int):
+        if score + 1 >= len(self.tree):
+            # doubles, so growing is amortized O(1) per point of score
+            self.build(2 * (score + 1), {level: len(bucket) for level, bucket in self.buckets.items()})
+        i = score + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def at_most(self, score: int) -> int:
+        # players with this score or less
+        i = min(score + 1, len(self.tree) - 1)
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def move(self, name: str, old: int, new: int):
+        # old is None for a player new to the board
+        if old is not None:
+            bucket = self.buckets[old]
+            del bucket[name]
+            if not bucket:
+                del self.buckets[old]
+                del self.levels[bisect.bisect_left(self.levels, old)]
+            self.add(old, -1)
+        else:
+            self.players += 1
+
+        # counted first, a tree rebuilt on the way must not see the player yet
+        self.add(new, 1)
+        bucket = self.buckets.get(new)
+        if bucket is None:
+            bucket = self.buckets[new] = {}
+            bisect.insort(self.levels, new)
+        bucket[name] = None
+
+    def rank(self, score: int) -> int:
+        # 1 for the best, players with the same score share a rank
+        return self.players - self.at_most(score) + 1
+
+    def top(self, count: int) -> dict:
+        table = {}
+        for score in reversed(self.levels):
+            for name in self.buckets[score]:
+                if len(table) == count:
+                    return table
+                table[name] = score
+        return table
@@ -0,0 +1,110 @@
+import socket
+import struct
+
+from codec import BinaryCodec
+
+# every frame is a 4 byte big-endian payload length followed by the payload
+HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 1 << 20
+RECV_SIZE = 4096
+CODEC = BinaryCodec()
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode(message, codec=CODEC) -> bytes:
+    payload = codec.encode(message)
+    return HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    # a preallocated buffer the socket is read straight into. frames are
+    # decoded where they lie, unread bytes sit between start and end. the
+    # buffer only moves a partial frame to the front when the tail is full,
+    # and only grows for a frame larger than itself, back to its size once
+    # that frame is read
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE, codec=CODEC, capacity: int = RECV_SIZE):
+        self.max_frame_size = max_frame_size
+        self.codec = codec
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def free(self) -> memoryview:
+        # the writable tail, made room for first when there is none
+        if self.end == len(self.buffer):
+            unread = self.end - self.start
+            needed = unread + 1
+            if unread >= HEADER.size:
+                needed = max(needed, HEADER.size + HEADER.unpack_from(self.buffer, self.start)[0])
+
+            if needed <= len(self.buffer):
+                self.buffer[:unread] = self.view[self.start:self.end]
+            else:
+                # a new buffer rather than a resize, decoded views may still
+                # point into the old one
+                buffer = bytearray(needed)
+                buffer[:unread] = self.view[self.start:self.end]
+                self.buffer = buffer
+                self.view = memoryview(buffer)
+            self.start = 0
+            self.end = unread
+        return self.view[self.end:]
+
+    def filled(self, size: int):
+        self.end += size
+
+    def parse(self) -> list:
+        messages = []
+        start = self.start
+        while self.end - start >= HEADER.size:
+            (length,) = HEADER.unpack_from(self.buffer, start)
+            if length > self.max_frame_size:
+                raise ProtocolError(f'frame of {length} bytes exceeds limit {self.max_frame_size}')
+
+            end = start + HEADER.size + length
+            if self.end < end:
+                break
+            messages.append(self.codec.decode(self.view[start + HEADER.size:end]))
+            start = end
+
+        self.start = start
+        if start == self.end:
+            self.start = self.end = 0
+            if len(self.buffer) > self.capacity:
+                self.buffer = bytearray(self.capacity)
+                self.view = memoryview(self.buffer)
+        return messages
+
+    def recv_into(self, sock: socket.socket) -> int:
+        # 0 once the peer has closed the connection
+        size = sock.recv_into(self.free())
+        self.filled(size)
+        return size
+
+    def feed(self, data: bytes) -> list:
+        # for bytes read elsewhere, copied in
+        messages = []
+        data = memoryview(data)
+        while data:
+            tail = self.free()
+            size = min(len(tail), len(data))
+            tail[:size] = data[:size]
+            self.filled(size)
+            messages += self.parse()
+            data = data[size:]
+        return messages
+
+    def pending(self) -> bytes:
+        return bytes(self.view[self.start:self.end])
+
+
+def recv_messages(sock: socket.socket, decoder: FrameDecoder):
+    # returns None once the peer has closed the connection
+    if not decoder.recv_into(sock):
+        return None
+    return decoder.parse()
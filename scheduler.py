@@ -0,0 +1,149 @@
+import asyncio
+import math
+import threading
+import time
+from threading import Lock
+
+LEVEL_BITS = 6
+LEVEL_SIZE = 1 << LEVEL_BITS
+LEVEL_MASK = LEVEL_SIZE - 1
+LEVELS = 4  # 64 ** 4 ticks, about 9.7 days at the default tick
+
+
+class Timer:
+    __slots__ = ('wheel', 'expires', 'callback', 'slot')
+
+    def __init__(self, wheel: 'TimerWheel', expires: int, callback):
+        self.wheel = wheel
+        self.expires = expires  # tick the timer fires on
+        self.callback = callback
+        self.slot = None  # type: dict # the wheel slot holding the timer, None once fired or cancelled
+
+    def cancel(self):
+        self.wheel.cancel(self)
+
+
+class TimerWheel:
+    # hierarchical timer wheel shared by every room. level 0 has a slot per
+    # tick, every level above a slot per full turn of the level below; timers
+    # move down a level when the wheel reaches their slot. a slot is a dict
+    # so scheduling and cancelling are both O(1). the wheel is advanced by
+    # one thread (start) or by the event loop (attach)
+    def __init__(self, tick: float = 0.05):
+        self.tick = tick
+        self.levels = [[{} for _ in range(LEVEL_SIZE)] for _ in range(LEVELS)]
+
+        self.lock = Lock()  # guards levels, ticks and count
+        self.origin = time.monotonic()
+        self.ticks = 0  # the next tick to process
+        self.count = 0  # timers waiting
+
+        self.stopped = threading.Event()
+        self.thread = None  # type: threading.Thread
+        self.loop = None  # type: asyncio.AbstractEventLoop
+
+    def __len__(self):
+        return self.count
+
+    def call_later(self, delay: float, callback) -> Timer:
+        # rounded up to a whole tick so timers never fire early
+        expires = math.ceil((time.monotonic() + delay - self.origin) / self.tick)
+        with self.lock:
+            timer = Timer(self, expires, callback)
+            self.place(timer)
+            self.count += 1
+        return timer
+
+    def cancel(self, timer: Timer):
+        with self.lock:
+            if timer.slot is not None:
+                del timer.slot[timer]
+                timer.slot = None
+                self.count -= 1
+
+    def place(self, timer: Timer):
+        delta = timer.expires - self.ticks
+        if delta < 0:
+            timer.expires = self.ticks
+            delta = 0
+        elif delta >= LEVEL_SIZE ** LEVELS:
+            timer.expires = self.ticks + LEVEL_SIZE ** LEVELS - 1
+            delta = LEVEL_SIZE ** LEVELS - 1
+
+        level = 0
+        while delta >= LEVEL_SIZE << (LEVEL_BITS * level):
+            level += 1
+        slot = self.levels[level][(timer.expires >> (LEVEL_BITS * level)) & LEVEL_MASK]
+        slot[timer] = None
+        timer.slot = slot
+
+    def cascade(self, level: int):
+        index = (self.ticks >> (LEVEL_BITS * level)) & LEVEL_MASK
+        slot = self.levels[level][index]
+        self.levels[level][index] = {}
+        for timer in slot:
+            self.place(timer)
+        return index
+
+    def advance(self, now: float = None):
+        # fires every timer due by now
+        if now is None:
+            now = time.monotonic()
+        target = int((now - self.origin) / self.tick)
+
+        while True:
+            with self.lock:
+                if self.ticks > target:
+                    return
+                if not self.count:
+                    # nothing to fire, skip the empty ticks in one go
+                    self.ticks = target + 1
+                    return
+
+                if not self.ticks & LEVEL_MASK:
+                    level = 1
+                    while level < LEVELS and not self.cascade(level):
+                        level += 1
+
+                index = self.ticks & LEVEL_MASK
+                due = self.levels[0][index]
+                self.levels[0][index] = {}
+                for timer in due:
+                    timer.slot = None
+                self.count -= len(due)
+                self.ticks += 1
+
+            for timer in due:
+                try:
+                    timer.callback()
+                except Exception as e:
+                    print(f'timer error {e}')
+
+    def next_tick(self) -> float:
+        return self.origin + self.ticks * self.tick
+
+    def run(self):
+        while not self.stopped.is_set():
+            delay = self.next_tick() - time.monotonic()
+            if delay > 0 and self.stopped.wait(delay):
+                break
+            self.advance()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        # drive the wheel from the loop instead of a thread, callbacks then
+        # run on the loop
+        self.loop = loop
+        self.loop_tick()
+
+    def loop_tick(self):
+        if self.stopped.is_set():
+            return
+        self.advance()
+        self.loop.call_later(max(0.0, self.next_tick() - time.monotonic()), self.loop_tick)
+
+    def stop(self):
+        self.stopped.set()
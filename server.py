@@ -1,322 +1,919 @@
-import json
-import time
-from collections import Counter
-import pickle
-import random
+import abc
+import argparse
+import asyncio
+import functools
+import itertools
+from collections import Counter, deque
+import queue
 import socket
 import threading
-from threading import Lock
-from data.words import Words
+import time
+from threading import Lock, RLock
+from anagrams import contains, signature
+from data.words import WORDS, random_word
+from dictionary import dictionary, is_word, solution_index
+from protocol import FrameDecoder, encode, recv_messages
+from scheduler import Timer, TimerWheel
+from storage import HASH_ITERATIONS, CredentialStore, ScoreStore
 # Constants
 HOST = '127.0.0.1'
 PORT = 65432
+LISTEN_BACKLOG = 1024
+LOBBY_TIME = 10  # seconds to press start once somebody did
+ROUND_TIME = 60
+SCORE_TICK = 0.1  # seconds over which score changes are collected into one message
+OUTBOUND_LIMIT = 256  # frames queued per client before the slow client policy kicks in
+WRITE_BUFFER_LIMIT = 64 * 1024
+SLOW_CLIENT_POLICIES = ('disconnect', 'drop')
+TABLE_SIZE = 10  # leaderboard entries sent to clients
+SESSION_IDS = itertools.count(1)
+IDLE_TIMEOUT = 45.0  # seconds a client may stay silent, or leave its frames unread; pinged after a third
+REAP_SWEEPS = 9  # sweeps for idle clients per idle timeout
+SUBMISSION_LIMIT = 1000  # distinct words a player may try per round
+REJECT_RATE = 5.0  # rejected submissions per second a player earns back
+REJECT_BURST = 20
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def ready(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
 
 
 class Room:
+    # every room has its own lock. it guards the room's state and is held
+    # while a message is queued for the room's clients, so they see the
+    # room's messages in the order its state changed. sends never block,
+    # and a room never takes another room's or the registry's lock
     def __init__(self, name: str, client: 'GameServer'):
         self.name = name
         self.client = client
+        self.lock = RLock()
 
-        self.clients = []
-        self.names = []  # type: [str]
-        self.words_history = []  # type: [str]
+        self.clients = {}  # type: {int: Session} # {session_id: session}
+        self.closed = False  # the last client left, the room is gone for good
+        self.found = set()  # type: {str} # words scored this round
+        self.submissions = {}  # type: {str: {str}} # {player: words tried this round}
+        self.limits = {}  # type: {str: TokenBucket} # {player: budget for rejected submissions}
         self.game_started = False
-        self.active_players = []
+        self.active_players = {}  # type: {int: Session} # {session_id: session} pressed start
 
         self.scores = Counter()
+        self.changed = {}  # type: {str: int} # scores changed since the last score message
+        self.score_timer = None  # type: Timer
         self.current_word = ''
+        self.current_signature = 0
+        self.solutions = None  # type: frozenset # every valid word of the round, if indexed
         self.current_winner = ()  # type: (str, int)
+        self.timer = None  # type: Timer # the pending lobby or round phase change
+        self.phase = 0  # bumped whenever the pending phase change is replaced or cancelled
 
-        words = Words()
-        self.dataset = words.words
+        self.dataset = WORDS
 
     @staticmethod
     def check_word(reference, word):
-        word_counter = Counter(word)
-        reference_counter = Counter(reference)
+        return contains(signature(reference), word)
 
-        for letter, count in word_counter.items():
-            if count > reference_counter.get(letter, 0):
+    def schedule(self, delay: float, callback):
+        # a phase change that already left the wheel when it was cancelled
+        # finds the phase moved on and does nothing
+        self.phase += 1
+        self.timer = self.client.call_later(delay, functools.partial(callback, self.phase))
+
+    def start_game(self, client: 'Session') -> bool:
+        # False while a round is played, joining it midway isn't possible
+        with self.lock:
+            if self.current_word:
                 return False
+            self.active_players[client.id] = client
+            if not self.game_started:
+                self.game_started = True
+                # score messages are deltas, the tables start over only here
+                self.room_broadcast(msg_type='score', msg2_type='scores', msg={}, all=True, reset=1)
+                self.room_broadcast(msg_type='info', msg2_type='message', msg='press start to play game', all=True)
+                self.schedule(self.client.lobby_time, self.start)
+                self.room_broadcast(msg_type='timer', msg2_type='message', msg='press start', all=True,
+                                    deadline=int(self.client.lobby_time * 1000))
+            return True
+
+    def start(self, phase: int):
+        with self.lock:
+            if phase != self.phase:
+                return
+            self.timer = None
+            if len(self.active_players) > 1:
+                self.current_word = random_word()
+                self.current_signature = signature(self.current_word)
+                self.solutions = solution_index().get(self.current_word)
+                self.schedule(self.client.round_time, self.game_end)
+                self.room_broadcast(msg_type='start', msg2_type='word', msg=self.current_word, all=False,
+                                    deadline=int(self.client.round_time * 1000))
+
+            else:
+                self.room_broadcast(msg_type='info', msg2_type='message', msg='you can not play alone', all=False)
+                self.active_players.clear()
+                self.game_started = False
+
+    def game_end(self, phase: int):
+        with self.lock:
+            if phase != self.phase:
+                return
+            self.timer = None
+            if self.score_timer:
+                self.score_timer.cancel()
+            self.flush_scores()
+            message = 'game ended'
+            if self.solutions is not None:
+                message = f'game ended. found {len(self.found)} of {len(self.solutions)} words'
+            self.room_broadcast(msg_type='end', msg2_type='message', msg=message, all=False)
 
-        return True
+            self.current_winner = self.scores.most_common(1)
+            players = list(self.active_players.values())
+            self.reset_round()
 
-    def start_game(self, client: socket.socket):
-        if self.game_started:
-            self.active_players.append(client)
-        else:
-            self.game_started = True
-            self.active_players.append(client)
-            self.room_broadcast(msg_type='info', msg2_type='message', msg='press start to play game', all=True)
-            timer = threading.Timer(10, self.start)
-            timer.start()
-            time.sleep(0.2)
-            self.room_broadcast(msg_type='timer', msg2_type='message', msg='10', all=True)
+        # the leaderboard is shared by every room, it is updated outside the room's lock
+        if self.current_winner:
+            try:
+                self.client.update_table(self.current_winner[0][0], players)
+            except Exception as e:
+                print(f'exception {e}')
 
-    def start(self):
-        if len(self.active_players) > 1:
-            self.current_word = random.choice(self.dataset)
-            self.room_broadcast(msg_type='start', msg2_type='word', msg=self.current_word, all=False)
-            timer = threading.Timer(60, self.game_end)
-            timer.start()
-            self.room_broadcast(msg_type='timer', msg2_type='message', msg='60', all=False)
+    def reset_round(self):
+        self.active_players = {}
+        self.game_started = False
+        self.scores.clear()
+        self.found.clear()
+        self.submissions.clear()
+        self.limits.clear()
+        self.current_word = ''
+        self.current_signature = 0
+        self.solutions = None
 
-        else:
-            self.room_broadcast(msg_type='info', msg2_type='message', msg='you can not play alone', all=False)
-            self.active_players.clear()
-            self.game_started = False
+    def submit_word(self, client: 'Session', word: str) -> bool:
+        # whether the word scored. only the round's players may submit
+        player = client.name
+        with self.lock:
+            if not self.current_word or client.id not in self.active_players:
+                return False
 
-    def game_end(self):
-        self.room_broadcast(msg_type='end', msg2_type='message', msg='game ended', all=False)
-        try:
-            self.current_winner = self.scores.most_common(1)
-            self.client.update_table(self.current_winner[0][0])
-        except Exception as e:
-            print(f'exception {e}')
+            # rejections cost tokens, a player out of them is ignored before
+            # any validation happens
+            bucket = self.limits.get(player)
+            if bucket is None:
+                bucket = self.limits[player] = TokenBucket(REJECT_RATE, REJECT_BURST)
+            if not bucket.ready():
+                return False
 
-        self.active_players = []
-        self.game_started = False
-        self.scores.clear()
-        self.words_history.clear()
-
-    def submit_word(self, player, word):
-        if (self.check_word(word=word, reference=self.current_word)
-                and self.is_correct_word(word)):
-            self.scores[player] = self.scores.get(player, 0) + 1
-            self.room_broadcast(msg_type='score', msg2_type='scores', msg=self.scores, all=False)
-            self.words_history.append(word)
-
-    def room_broadcast(self, msg_type: str, msg2_type: str, msg, all: bool):
-        if all:
-            for client in self.clients:
-                try:
-                    client.sendall(pickle.dumps({"type": msg_type, msg2_type: msg}))
-                except Exception as e:
-                    print(f'connection error {e}')
-                    self.remove_client(client, 'lol')
-                    client.close()
-        else:
-            for client in self.active_players:
+            tried = self.submissions.get(player)
+            if tried is None:
+                tried = self.submissions[player] = set()
+            if word in tried or len(tried) >= SUBMISSION_LIMIT:
+                bucket.take()
+                return False
+            tried.add(word)
+
+            if self.is_valid_word(word) and self.is_correct_word(word):
+                self.found.add(word)
+                self.scores[player] = self.scores.get(player, 0) + 1
+                self.changed[player] = self.scores[player]
+                if self.score_timer is None:
+                    self.score_timer = self.client.call_later(self.client.score_tick, self.flush_scores)
+                return True
+            bucket.take()
+            return False
+
+    def flush_scores(self):
+        # one score message per tick carrying only the scores that changed
+        with self.lock:
+            self.score_timer = None
+            changed, self.changed = self.changed, {}
+            if changed:
+                self.room_broadcast(msg_type='score', msg2_type='scores', msg=changed, all=False)
+
+    def room_broadcast(self, msg_type: str, msg2_type: str, msg, all: bool, **fields):
+        # serialized once, every recipient gets the same frame queued. the
+        # recipients are copied first, a failed send removes its client
+        data = encode({"type": msg_type, msg2_type: msg, **fields})
+        with self.lock:
+            for client in list((self.clients if all else self.active_players).values()):
                 try:
-                    client.sendall(pickle.dumps({"type": msg_type, msg2_type: msg}))
+                    client.send(data)
                 except Exception as e:
                     print(f'connection error {e}')
-                    self.remove_client(client, 'lol')
+                    self.remove_client(client, client.name)
                     client.close()
 
+    def is_valid_word(self, word: str):
+        if self.solutions is not None:
+            return word in self.solutions
+        return contains(self.current_signature, word) and is_word(word)
+
     def is_correct_word(self, word: str):
-        if word in self.words_history:
-            return False
-        return True
-
-    def add_client(self, client: socket.socket, name: str):
-        if client not in self.clients:
-            self.clients.append(client)
-            self.names.append(name)
-
-    def remove_client(self, client: socket.socket, name: str):
-        if client in self.clients:
-            self.clients.remove(client)
-            if name in self.names:
-                self.names.remove(name)
+        # nobody in the room scored it yet this round
+        return word not in self.found
+
+    def add_client(self, client: 'Session', name: str) -> bool:
+        # False once the room has closed
+        with self.lock:
+            if self.closed:
+                return False
+            self.clients[client.id] = client
+            return True
+
+    def remove_client(self, client: 'Session', name: str):
+        with self.lock:
+            if self.clients.pop(client.id, None) is None:
+                return
+            self.active_players.pop(client.id, None)
             self.room_broadcast(msg_type='info', msg2_type='message', msg=f'player {name} left game', all=True)
+            if not self.clients:
+                self.closed = True
+                self.cancel_game()
+
+        if self.closed:
+            self.client.rooms.discard(self)
+        else:
+            self.client.lobby.touch(self.name)
+
+    def cancel_game(self):
+        # everybody left mid-countdown, nothing left to start or end
+        with self.lock:
+            self.phase += 1
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            if self.score_timer:
+                self.score_timer.cancel()
+                self.score_timer = None
+            self.changed = {}
+            self.reset_round()
+
+
+class RoomRegistry:
+    # rooms by name; a room is dropped as soon as its last client leaves.
+    # the registry's lock only guards the dict, it is never held while a
+    # room's lock is taken
+    def __init__(self, server: 'GameServer'):
+        self.server = server
+        self.lock = Lock()  # guards rooms
+        self.rooms = {}  # type: {str: Room}
+
+    def __contains__(self, name: str):
+        return name in self.rooms
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def get(self, name: str):
+        return self.rooms.get(name)
+
+    def names(self) -> list:
+        return list(self.rooms)
+
+    def create(self, name: str, session: 'Session'):
+        # None when the name is taken
+        room = Room(name, self.server)
+        room.add_client(session, session.name)
+        with self.lock:
+            existing = self.rooms.get(name)
+            if existing is not None and not existing.closed:
+                return None
+            self.rooms[name] = room
+        session.room = room
+        self.server.lobby.touch(name)
+        return room
+
+    def join(self, name: str, session: 'Session'):
+        # None when there is no such room, or it closed meanwhile
+        room = self.rooms.get(name)
+        if room is None or not room.add_client(session, session.name):
+            return None
+        session.room = room
+        self.server.lobby.touch(name)
+        return room
+
+    def discard(self, room: Room):
+        # rooms only close once, a closed room never gets clients again
+        with self.lock:
+            if self.rooms.get(room.name) is not room:
+                return
+            del self.rooms[room.name]
+        self.server.lobby.touch(room.name)
+
+
+class Lobby:
+    # tells registered clients about room changes. changes are collected for
+    # a short window and then sent as room_added / room_removed /
+    # room_player_count events computed against what the lobby last saw
+    def __init__(self, server: 'GameServer', window: float = 0.05):
+        self.server = server
+        self.window = window
+
+        self.lock = Lock()  # guards touched and known
+        self.touched = set()  # type: {str} # rooms changed since the last flush
+        self.known = {}  # type: {str: int} # {room_name: players} as last sent
+
+    def snapshot(self) -> dict:
+        return {name: len(room.clients) for name, room in list(self.server.rooms.rooms.items())}
+
+    def players(self, name: str):
+        # None once the room is gone
+        room = self.server.rooms.get(name)
+        return len(room.clients) if room else None
+
+    def touch(self, name: str):
+        with self.lock:
+            schedule = not self.touched
+            self.touched.add(name)
+        if schedule:
+            self.server.call_later(self.window, self.flush)
+
+    def flush(self):
+        events = []
+        with self.lock:
+            touched, self.touched = self.touched, set()
+            for name in touched:
+                players = self.players(name)
+                known = self.known.get(name)
+
+                if players is None:
+                    if known is not None:
+                        del self.known[name]
+                        events.append({'type': 'room_removed', 'room': name})
+                elif known is None:
+                    self.known[name] = players
+                    events.append({'type': 'room_added', 'room': name, 'players': players})
+                elif known != players:
+                    self.known[name] = players
+                    events.append({'type': 'room_player_count', 'room': name, 'players': players})
+
+        if not events:
+            return
+
+        data = b''.join(encode(event) for event in events)
+        for client in list(self.server.clients_with_name.values()):
+            try:
+                client.send(data)
+            except Exception as e:
+                print(f'error with {client} with exception {e}')
+
+
+class Session(abc.ABC):
+    # a connected client. send() never blocks: frames go to a bounded
+    # outbound queue, and a client that lets it fill up is disconnected or
+    # loses frames depending on the policy
+    def __init__(self, address, outbound_limit: int = OUTBOUND_LIMIT, policy: str = 'disconnect'):
+        self.id = next(SESSION_IDS)
+        self.address = address
+        self.name = ''
+        self.room = None  # type: Room
+        self.decoder = FrameDecoder()
+
+        self.outbound_limit = outbound_limit
+        self.policy = policy
+        self.dropped = 0
+
+        # deadlines: last_seen is when the client last sent anything, blocked
+        # when a write started waiting for the client to read, None if none is
+        self.last_seen = time.monotonic()
+        self.blocked = None  # type: float
+
+    @abc.abstractmethod
+    def send(self, data: bytes):
+        pass
+
+    def overflow(self):
+        self.dropped += 1
+        if self.policy == 'disconnect':
+            print(f'disconnecting slow client {self.address}')
+            self.abort()
+
+    @abc.abstractmethod
+    def close(self):
+        pass
+
+    def abort(self):
+        self.close()
+
+
+class SocketSession(Session):
+    def __init__(self, sock: socket.socket, address, outbound_limit: int = OUTBOUND_LIMIT,
+                 policy: str = 'disconnect'):
+        super().__init__(address, outbound_limit, policy)
+        self.socket = sock
+        self.outbound = queue.Queue(outbound_limit)
+        self.backlog = deque()  # decoded commands not handled yet
+        self.closed = False
+        self.detached = False
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+
+    def start(self):
+        self.writer.start()
+
+    def send(self, data: bytes):
+        if self.closed:
+            raise ConnectionError('session is closed')
+        try:
+            self.outbound.put_nowait(data)
+        except queue.Full:
+            self.overflow()
+
+    def write_loop(self):
+        try:
+            while True:
+                data = self.outbound.get()
+                if data is None:
+                    break
+                self.blocked = time.monotonic()
+                self.socket.sendall(data)
+                self.blocked = None
+        except OSError as e:
+            if not self.closed:
+                print(f'send error with {self.address}: {e}')
+        finally:
+            if not self.detached:
+                self.close()
+
+    def detach(self, timeout: float = 5.0):
+        # stops the session once everything queued is sent and gives up the
+        # socket without closing it, None when the queue doesn't drain in time
+        if self.closed:
+            return None
+        self.detached = True
+        try:
+            self.outbound.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.writer.join(timeout)
+        if self.writer.is_alive():
+            self.detached = False
+            self.close()
+            return None
+        self.closed = True
+        return self.socket
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            # also wakes up the reader and a writer stuck in sendall
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+        try:
+            self.outbound.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class AsyncSession(Session):
+    # the transport buffers up to its high-water mark, past that frames wait
+    # in pending until the loop has drained the socket
+    def __init__(self, transport: asyncio.Transport, address, outbound_limit: int = OUTBOUND_LIMIT,
+                 policy: str = 'disconnect'):
+        super().__init__(address, outbound_limit, policy)
+        self.transport = transport
+        self.transport.set_write_buffer_limits(high=WRITE_BUFFER_LIMIT)
+        self.pending = deque()
+        self.paused = False
+
+    def send(self, data: bytes):
+        if self.transport.is_closing():
+            raise ConnectionError('transport is closed')
+        if not self.paused:
+            self.transport.write(data)
+        elif len(self.pending) < self.outbound_limit:
+            self.pending.append(data)
+        else:
+            self.overflow()
+
+    def pause_writing(self):
+        self.paused = True
+        self.blocked = time.monotonic()
+
+    def resume_writing(self):
+        self.paused = False
+        self.blocked = None
+        while self.pending and not self.paused:
+            self.transport.write(self.pending.popleft())
+
+    def close(self):
+        self.transport.close()
+
+    def abort(self):
+        self.pending.clear()
+        self.transport.abort()
 
 
 # Server Code
 class GameServer:
-    def __init__(self, host, port):
+    def __init__(self, host, port, slow_client_policy: str = 'disconnect', lobby_time: float = LOBBY_TIME,
+                 round_time: float = ROUND_TIME, score_tick: float = SCORE_TICK,
+                 idle_timeout: float = IDLE_TIMEOUT, hash_iterations: int = HASH_ITERATIONS):
         # connection
         self.host = host
         self.port = port
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        self.slow_client_policy = slow_client_policy
+        self.lobby_time = lobby_time
+        self.round_time = round_time
+        self.score_tick = score_tick
+        self.idle_timeout = idle_timeout
+        self.server_socket = self.listen()
 
-        # for thread
-        self.lock = Lock()
+        # timers of every room
+        self.timers = TimerWheel()
 
         # clients
-        self.names_passwords = {}  # type: {str: str} # {name: password}
-        self.clients = []  # type: [socket.socket] # List of connected clients
-        self.clients_with_name = {}  # type: {socket.socket: str} # {soket: name}
+        self.credentials = None  # type: CredentialStore
+        self.clients = {}  # type: {int: Session} # {session_id: session} connected clients
+        self.clients_with_name = {}  # type: {int: Session} # {session_id: session} registered clients
 
         # rooms
-        self.rooms = []  # type: [Room] # {room_name: [clients]}
-        self.rooms_names = []
+        self.rooms = RoomRegistry(self)
+        self.lobby = Lobby(self)
 
         # data of words
-        words = Words()
-        self.dataset = words.words
+        self.dataset = WORDS
         self.current_words = {}  # type: {str: str} # {room_name: current_word}
 
         # for tables or scores
-        self.scores = {}  # type: {str: int} # {client_name: score}
-        self.table = Counter()
-
-        print(f"Server started on {self.host}:{self.port}")
+        self.score_store = None  # type: ScoreStore
+        self.open_stores(hash_iterations)
+
+        # load the word list up front instead of on the first submission
+        dictionary()
+        solution_index()
+
+        self.call_later(self.idle_timeout / REAP_SWEEPS, self.reap)
+
+        if self.server_socket:
+            print(f"Server started on {self.host}:{self.port}")
+
+    def listen(self) -> socket.socket:
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server_socket.bind((self.host, self.port))
+        server_socket.listen(LISTEN_BACKLOG)
+        return server_socket
+
+    def open_stores(self, hash_iterations: int):
+        self.credentials = CredentialStore(iterations=hash_iterations)
+        self.score_store = ScoreStore()
+        self.score_store.start()
+
+    def call_later(self, delay: float, callback):
+        return self.timers.call_later(delay, callback)
+
+    def reap(self):
+        # drops clients that went silent past the idle timeout or stopped
+        # reading what they are sent, pings the ones that are merely quiet.
+        # a client that vanished without closing its connection is otherwise
+        # only noticed when a write to it fails
+        self.call_later(self.idle_timeout / REAP_SWEEPS, self.reap)
+        now = time.monotonic()
+        ping = encode({'type': 'ping'})
+        dead = []
+        for session in list(self.clients.values()):
+            if (now - session.last_seen > self.idle_timeout
+                    or session.blocked is not None and now - session.blocked > self.idle_timeout):
+                dead.append(session)
+            elif now - session.last_seen > self.idle_timeout / 3:
+                try:
+                    session.send(ping)
+                except Exception:
+                    dead.append(session)
+
+        if dead:
+            print(f'dropping {len(dead)} idle clients')
+        for session in dead:
+            # the session's reader sees the connection close and leaves the room
+            self.forget(session)
+            session.abort()
+
+    def handle_message(self, session: 'Session', message: dict):
+        command = message.get("command")
+        room = session.room
+
+        if command == 'registration':
+            session.name = message['name']
+            return self.register(session, message)
+
+        if command == 'create_room':
+            self.leave_room(session)
+
+            room_name = message['room']
+            room = self.rooms.create(room_name, session)
+            if room:
+                self.reply(session, message, {'type': 'created', 'message': room_name})
+                room.room_broadcast(msg_type='info', msg2_type='message',
+                                    msg=f'{session.name} created {room_name}', all=True)
+
+            else:
+                self.reply(session, message, {'type': 'info',
+                                              'message': f'this room already created. you can join it'})
+
+        if command == "join_room":
+            self.leave_room(session)
+
+            room_name = message['room']
+            room = self.rooms.join(room_name, session)
+            if room:
+                self.reply(session, message, {'type': 'joined', 'message': room_name})
+                room.room_broadcast(msg_type='info', msg2_type='message',
+                                    msg=f'{session.name} joined {room_name}', all=True)
+            else:
+                self.reply(session, message, {'type': 'info', 'message': "There's no room like this"})
+
+        elif command == 'leave_room' and room:
+            self.leave_room(session)
+            room.room_broadcast(msg_type='info', msg2_type='message', msg=f'{session.name} leave room', all=True)
+
+        elif command == "start_game" and room:
+            if room.start_game(client=session):
+                self.reply(session, message, {'type': 'info', 'message': 'you are in game'})
+            else:
+                self.reply(session, message, {'type': 'info', 'message': 'wait for the round to end'})
+
+        elif command == "submit_word" and room:
+            # points go to the session's own name, whatever player the message claims
+            word = message["word"]
+
+            scored = room.submit_word(session, word)
+            if message.get('id') is not None:
+                # only asked for, everybody learns about points from the scores
+                self.reply(session, message, {'type': 'submitted', 'word': word, 'scored': int(scored)})
+
+        elif command == 'ping':
+            self.reply(session, message, {'type': 'pong'})
+
+        elif command == 'exit':
+            self.forget(session)
+            self.leave_room(session)
+
+    def reply(self, session: 'Session', request: dict, message: dict):
+        # a direct reply carries the id of the command it answers, so a
+        # client can have several commands in flight
+        if request.get('id') is not None:
+            message['id'] = request['id']
+        session.send(encode(message))
+
+    def leave_room(self, session: 'Session'):
+        if session.room:
+            session.room.remove_client(session, session.name)
+            session.room = None
+
+    def register(self, session: 'Session', request: dict):
+        ok = self.credentials.authenticate(session.name, request['password']).result()
+        self.finish_registration(session, request, ok)
+
+    def finish_registration(self, session: 'Session', request: dict, ok: bool):
+        if ok:
+            self.reply(session, request, {'type': 'registration', 'message': 'ok'})
+            self.clients_with_name[session.id] = session
+            self.send_table(session)
+            self.send_rooms(session)
+        else:
+            self.reply(session, request, {'type': 'registration', 'message': 'no'})
 
-    def handle_client(self, client: socket.socket, address):
-        client_name = ''
-        room = None
-        print(f"New connection from {address}")
+    def handle_client(self, session: 'SocketSession'):
+        print(f"New connection from {session.address}")
         try:
             while True:
-                data = client.recv(1024)
-                if not data:
+                while session.backlog and not session.detached:
+                    self.handle_message(session, session.backlog.popleft())
+                if session.detached:
                     break
 
-                message = pickle.loads(data)
-                command = message.get("command")
-
-                if command == 'registration':
-                    client_name = message['name']
-                    client_password = message['password']
-
-                    with open('data/passwords.json', 'r') as file:
-                        data = json.load(file)
-                        data_password = data.get(client_name, '')
-
-                    if data_password:
-                        if data_password == client_password:
-                            client.sendall(pickle.dumps({'type': 'registration', 'message': 'ok'}))
-                            time.sleep(0.3)
-                            self.clients_with_name[client] = client_name
-                            self.send_table(client)
-                            time.sleep(0.01)
-                            self.rooms_update()
-                        else:
-                            client.sendall(pickle.dumps({'type': 'registration', 'message': 'no'}))
-                    else:
-                        with self.lock:
-                            data[client_name] = client_password
-
-                            with open('data/passwords.json', 'w') as file:
-                                json.dump(data, file, indent=4)
-
-                            client.sendall(pickle.dumps({'type': 'registration', 'message': 'ok'}))
-                            time.sleep(0.3)
-                            self.clients_with_name[client] = client_name
-                            self.send_table(client)
-                            time.sleep(0.01)
-                            self.rooms_update()
-
-                if command == 'create_room':
-                    if room:
-                        room.remove_client(client, client_name)
-
-                    room_name = message['room']
-                    if room_name not in self.rooms_names:
-                        client.sendall(pickle.dumps({'type': 'created', 'message': room_name}))
-
-                        room = Room(room_name, self)
-                        self.rooms.append(room)
-                        self.rooms_names.append(room_name)
-                        room.add_client(client, client_name)
-                        room.room_broadcast(msg_type='info', msg2_type='message',
-                                            msg=f'{client_name} created {room_name}', all=True)
-
-                        self.rooms_update()
-
-                    else:
-                        client.sendall(pickle.dumps({'type': 'info',
-                                                     'message': f'this room already created. you can join it'}))
-
-                if command == "join_room":
-                    if room:
-                        room.remove_client(client, client_name)
-
-                    room_name = message['room']
-
-                    for room in self.rooms:
-                        if room.name == room_name:
-                            client.sendall(pickle.dumps({'type': 'joined', 'message': room_name}))
-                            room.add_client(client, client_name)
-                            room.room_broadcast(msg_type='info', msg2_type='message',
-                                                msg=f'{client_name} joined {room_name}', all=True)
-                            break
-                    else:
-                        client.sendall(pickle.dumps({'type': 'info', 'message': "There's no room like this"}))
-
-                elif command == 'leave_room':
-                    room.remove_client(client, client_name)
-                    room.room_broadcast(msg_type='info', msg2_type='message', msg=f'{client_name} leave room', all=True)
-
-                elif command == "start_game":
-                    self.scores = {}
-                    room.room_broadcast(msg_type='score', msg2_type='scores', msg=self.scores, all=True)
-
-                    room.start_game(client=client)
-                    client.sendall(pickle.dumps({'type': 'info', 'message': 'you are in game'}))
-
-                elif command == "submit_word":
-                    player = message['player']
-                    word = message["word"]
-
-                    room.submit_word(player, word)
-
-                elif command == 'exit':
-                    self.clients.remove(client)
-                    if room:
-                        room.remove_client(client, client_name)
+                messages = recv_messages(session.socket, session.decoder)
+                if messages is None:
+                    break
+                session.last_seen = time.monotonic()
+                session.backlog.extend(messages)
 
         except Exception as e:
-            print(f"Error with client {address}: {e}")
+            print(f"Error with client {session.address}: {e}")
         finally:
-            print(f"Closing connection with {address}")
-            client.close()
-
-    def rooms_update(self):
-        time.sleep(0.3)
-        for client in self.clients:
+            # a detached session was handed over to another process, socket and all
+            if not session.detached:
+                print(f"Closing connection with {session.address}")
+                self.leave_room(session)
+                self.forget(session)
+                session.close()
+
+    def send_rooms(self, client: 'Session'):
+        try:
+            client.send(encode({'type': 'rooms', 'message': self.lobby.snapshot()}))
+        except Exception as e:
+            print(f'error with {client} with exception {e}')
+            self.forget(client)
+
+    def update_table(self, client_name: str, players=()):
+        # everybody gets the new top of the board, the round's players get it
+        # together with their own rank instead
+        self.score_store.increment(client_name)
+        self.broadcast_table(self.score_store.top(TABLE_SIZE), skip={client.id for client in players})
+        for client in players:
+            self.send_table(client)
+
+    def broadcast_table(self, table: dict, skip=()):
+        # skip holds the ids of sessions that get their own table
+        data = encode({'type': 'table', 'message': table})
+
+        for client in list(self.clients.values()):
+            if client.id in skip:
+                continue
             try:
-                client.sendall(pickle.dumps({'type': 'rooms', 'message': self.rooms_names}))
+                client.send(data)
             except Exception as e:
                 print(f'error with {client} with exception {e}')
-                self.clients.remove(client)
-
-    def update_table(self, client_name: str):
-        with self.lock:
-            with open('data/scores.json', 'r') as file:
-                data = json.load(file)
-                data[client_name] = data.get(client_name, 0) + 1
-
-            send_table = dict(sorted(data.items(), key=lambda item: item[1], reverse=True))
-
-            for client in self.clients:
-
-                try:
-                    client.sendall(pickle.dumps({'type': 'table', 'message': send_table}))
-                except Exception as e:
-                    print(f'error with {client} with exception {e}')
-                    self.clients.remove(client)
-
-            with open('data/scores.json', 'w') as file:
-                json.dump(send_table, file, indent=4)
-
-    def send_table(self, client: socket.socket):
-        with open('data/scores.json', 'r') as file:
-            data = json.load(file)
+                self.forget(client)
 
+    def send_table(self, client: 'Session'):
         try:
-            client.sendall(pickle.dumps({'type': 'table', 'message': data}))
+            rank, score = self.score_store.rank(client.name)
+            client.send(encode({'type': 'table', 'message': self.score_store.top(TABLE_SIZE), 'rank': rank,
+                                'score': score}))
         except Exception as e:
             print(f'error with {client} with exception {e}')
-            self.clients.remove(client)
+            self.forget(client)
+
+    def forget(self, session: 'Session'):
+        # drops a session from the server's client lists, whatever it is in
+        self.clients.pop(session.id, None)
+        self.clients_with_name.pop(session.id, None)
+
+    def add_session(self, sock: socket.socket, address, name: str = '', backlog=(),
+                    buffered: bytes = b'') -> 'SocketSession':
+        # name, backlog and buffered carry the state of a session handed over
+        # from another process
+        session = SocketSession(sock, address, policy=self.slow_client_policy)
+        session.name = name
+        session.backlog.extend(backlog)
+        session.backlog.extend(session.decoder.feed(buffered))
+        session.start()
+        self.clients[session.id] = session
+        return session
+
+    def serve(self, session: 'SocketSession'):
+        threading.Thread(target=self.handle_client, args=(session,), daemon=True).start()
 
     def start(self):
+        self.timers.start()
         try:
             while True:
                 client, address = self.server_socket.accept()
-                with self.lock:
-                    self.clients.append(client)
-                threading.Thread(target=self.handle_client, args=(client, address), daemon=True).start()
+                client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.serve(self.add_session(client, address))
         except KeyboardInterrupt:
             print("Shutting down server.")
         finally:
             self.server_socket.close()
+            self.timers.stop()
+            self.score_store.close()
+            self.credentials.close()
+
+
+class GameProtocol(asyncio.BufferedProtocol):
+    # the loop reads straight into the session's frame buffer
+    def __init__(self, server: 'AsyncGameServer'):
+        self.server = server
+        self.session = None  # type: AsyncSession
+        self.backlog = deque()
+        self.waiting = None  # type: asyncio.Future # command that has to finish before the next one
+        self.closed = False  # commands still queued when the connection is lost are dropped
+
+    def connection_made(self, transport: asyncio.Transport):
+        address = transport.get_extra_info('peername')
+        # asyncio only sets this itself for sockets created with IPPROTO_TCP
+        transport.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.session = AsyncSession(transport, address, policy=self.server.slow_client_policy)
+        self.server.clients[self.session.id] = self.session
+        print(f"New connection from {address}")
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self.session.decoder.free()
+
+    def buffer_updated(self, nbytes: int):
+        self.session.last_seen = time.monotonic()
+        self.session.decoder.filled(nbytes)
+        try:
+            self.backlog.extend(self.session.decoder.parse())
+        except Exception as e:
+            print(f"Error with client {self.session.address}: {e}")
+            self.session.close()
+            return
+        self.process()
+
+    def process(self):
+        while self.backlog and self.waiting is None and not self.closed:
+            message = self.backlog.popleft()
+            try:
+                waiting = self.server.handle_message(self.session, message)
+            except Exception as e:
+                print(f"Error with client {self.session.address}: {e}")
+                self.session.close()
+                return
+            if waiting is not None:
+                self.waiting = waiting
+                waiting.add_done_callback(self.resume)
+
+    def resume(self, future: asyncio.Future):
+        self.waiting = None
+        if not self.closed:
+            self.process()
+
+    def pause_writing(self):
+        self.session.pause_writing()
+
+    def resume_writing(self):
+        self.session.resume_writing()
+
+    def connection_lost(self, exc):
+        print(f"Closing connection with {self.session.address}")
+        self.closed = True
+        self.backlog.clear()
+        self.server.leave_room(self.session)
+        self.server.forget(self.session)
+
+
+class AsyncGameServer(GameServer):
+    # serves every connection and round timer from a single event loop
+    def __init__(self, host, port, **options):
+        super().__init__(host, port, **options)
+        self.loop = None  # type: asyncio.AbstractEventLoop
+
+    def register(self, session: 'Session', request: dict):
+        # hashing runs in the credential pool, the loop only gets the verdict
+        future = asyncio.wrap_future(self.credentials.authenticate(session.name, request['password']))
+        future.add_done_callback(functools.partial(self.registered, session, request))
+        return future
+
+    def registered(self, session: 'AsyncSession', request: dict, future: asyncio.Future):
+        # the client may have left while its password was hashed
+        if session.transport.is_closing():
+            return
+        self.finish_registration(session, request, future.result())
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.timers.attach(self.loop)
+        server = await self.loop.create_server(lambda: GameProtocol(self), sock=self.server_socket)
+        async with server:
+            await server.serve_forever()
+
+    def start(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("Shutting down server.")
+        finally:
+            self.server_socket.close()
+            self.timers.stop()
+            self.score_store.close()
+            self.credentials.close()
+
+
+SERVERS = {
+    'threaded': GameServer,
+    'asyncio': AsyncGameServer,
+}
 
 
 # Main Execution
 if __name__ == "__main__":
-    server = GameServer(HOST, PORT)
-    threading.Thread(target=server.start).start()
+    parser = argparse.ArgumentParser(description='Anagrams game server')
+    parser.add_argument('--mode', choices=SERVERS, default='threaded')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--slow-clients', choices=SLOW_CLIENT_POLICIES, default='disconnect',
+                        help='what to do with a client whose outbound queue is full')
+    parser.add_argument('--lobby-time', type=float, default=LOBBY_TIME)
+    parser.add_argument('--round-time', type=float, default=ROUND_TIME)
+    parser.add_argument('--score-tick', type=float, default=SCORE_TICK,
+                        help='seconds over which score changes are batched')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='seconds of silence after which a client is dropped, it is pinged after a third')
+    parser.add_argument('--hash-iterations', type=int, default=HASH_ITERATIONS,
+                        help='pbkdf2 work factor for stored passwords')
+    args = parser.parse_args()
+
+    server = SERVERS[args.mode](args.host, args.port, slow_client_policy=args.slow_clients,
+                                lobby_time=args.lobby_time, round_time=args.round_time,
+                                score_tick=args.score_tick, idle_timeout=args.idle_timeout,
+                                hash_iterations=args.hash_iterations)
+    server.start()
@@ -0,0 +1,261 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+
+from leaderboard import Leaderboard
+
+SCORES_PATH = 'data/scores.json'
+SCORES_JOURNAL_PATH = 'data/scores.journal'
+PASSWORDS_PATH = 'data/passwords.json'
+PASSWORDS_LOG_PATH = 'data/passwords.log'
+HASH_ITERATIONS = 100_000
+HASH_WORKERS = 4
+
+
+class ScoreStore:
+    # scores live in memory; changed entries are appended to a journal in
+    # batches and the journal is folded back into scores.json now and then
+    def __init__(self, path: str = SCORES_PATH, journal_path: str = SCORES_JOURNAL_PATH,
+                 flush_interval: float = 5.0, compact_every: int = 1000):
+        self.path = path
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+
+        self.lock = Lock()  # guards scores and dirty
+        self.io_lock = Lock()  # serializes writes to the journal and snapshot
+        self.scores = {}  # type: {str: int} # {client_name: score}
+        self.dirty = {}  # type: {str: int} # changed since the last flush
+        self.leaderboard = None  # type: Leaderboard
+        self.journal_entries = 0
+
+        self.stopped = threading.Event()
+        self.flusher = None  # type: threading.Thread
+
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as file:
+                self.scores = json.load(file)
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r') as file:
+                for line in file:
+                    try:
+                        name, score = json.loads(line)
+                    except ValueError:
+                        # a torn last line from a crash mid-append
+                        continue
+                    self.scores[name] = score
+                    self.journal_entries += 1
+
+        self.leaderboard = Leaderboard(self.scores)
+
+    def increment(self, name: str, amount: int = 1) -> int:
+        with self.lock:
+            old = self.scores.get(name)
+            score = (old or 0) + amount
+            self.scores[name] = score
+            self.dirty[name] = score
+            self.leaderboard.move(name, old, score)
+        return score
+
+    def get(self, name: str) -> int:
+        return self.scores.get(name, 0)
+
+    def top(self, count: int) -> dict:
+        with self.lock:
+            return self.leaderboard.top(count)
+
+    def rank(self, name: str) -> (int, int):
+        # (rank, score), both None for a player without a score
+        with self.lock:
+            score = self.scores.get(name)
+            if score is None:
+                return None, None
+            return self.leaderboard.rank(score), score
+
+    def table(self) -> dict:
+        # every score, best first
+        with self.lock:
+            return self.leaderboard.top(len(self.scores))
+
+    def flush(self):
+        with self.io_lock:
+            with self.lock:
+                dirty, self.dirty = self.dirty, {}
+            if dirty:
+                with open(self.journal_path, 'a') as file:
+                    file.writelines(json.dumps([name, score]) + '\n' for name, score in dirty.items())
+                self.journal_entries += len(dirty)
+
+            if self.journal_entries >= self.compact_every:
+                self.compact_locked()
+
+    def compact(self):
+        with self.io_lock:
+            self.compact_locked()
+
+    def compact_locked(self):
+        # journal entries are absolute scores, so anything still dirty is
+        # simply written again by the next flush
+        table = self.table()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(table, file, indent=4)
+        os.replace(tmp_path, self.path)
+
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.journal_entries = 0
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'score flush error {e}')
+
+    def start(self):
+        self.flusher = threading.Thread(target=self.run, daemon=True)
+        self.flusher.start()
+
+    def close(self):
+        self.stopped.set()
+        if self.flusher:
+            self.flusher.join()
+        self.flush()
+        if self.journal_entries:
+            self.compact()
+
+
+class CredentialStore:
+    # passwords.json holds the old plaintext accounts, passwords.log is an
+    # append-only list of salted pbkdf2 records where later lines win. an
+    # account leaves passwords.json once its hash is in the log
+    def __init__(self, path: str = PASSWORDS_PATH, log_path: str = PASSWORDS_LOG_PATH,
+                 iterations: int = HASH_ITERATIONS, workers: int = HASH_WORKERS):
+        self.path = path
+        self.log_path = log_path
+        self.iterations = iterations
+
+        self.lock = Lock()  # guards records
+        self.io_lock = Lock()  # serializes appends to the log
+        self.legacy_lock = Lock()  # serializes rewrites of passwords.json
+        self.records = {}  # type: {str: (bytes, int, bytes)} # {name: (salt, iterations, digest)}
+        self.legacy = {}  # type: {str: str} # {name: password} accounts still in passwords.json
+        self.legacy_dirty = False  # legacy changed since passwords.json was written
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='credentials')
+
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as file:
+                self.legacy = json.load(file)
+            for name, password in self.legacy.items():
+                # no salt marks a legacy plaintext password
+                self.records[name] = (b'', 0, password.encode())
+
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'r') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.records[entry['name']] = (bytes.fromhex(entry['salt']), entry['iterations'],
+                                                   bytes.fromhex(entry['hash']))
+
+        # upgraded before passwords.json was rewritten
+        migrated = [name for name in self.legacy if self.records[name][0]]
+        if migrated:
+            for name in migrated:
+                del self.legacy[name]
+            self.legacy_dirty = True
+            self.write_legacy()
+
+    @staticmethod
+    def hash_password(password: str, salt: bytes, iterations: int) -> bytes:
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+
+    def authenticate(self, name: str, password: str) -> Future:
+        # resolves to True when the password matches or a new account was created
+        return self.executor.submit(self.check, name, password)
+
+    def check(self, name: str, password: str) -> bool:
+        record = self.records.get(name)
+        if record is None:
+            record = self.new_record(password)
+            with self.lock:
+                if name not in self.records:
+                    self.records[name] = record
+                    created = True
+                else:
+                    # somebody else signed up with this name in the meantime
+                    created = False
+            if created:
+                self.append(name, record)
+                return True
+            record = self.records[name]
+
+        if not self.verify(record, password):
+            return False
+
+        salt, iterations, _ = record
+        if not salt or iterations != self.iterations:
+            # upgrade plaintext or outdated records to the current work factor
+            record = self.new_record(password)
+            with self.lock:
+                self.records[name] = record
+            self.append(name, record)
+            if not salt:
+                self.drop_legacy(name)
+        return True
+
+    def new_record(self, password: str) -> (bytes, int, bytes):
+        salt = os.urandom(16)
+        return salt, self.iterations, self.hash_password(password, salt, self.iterations)
+
+    def verify(self, record: (bytes, int, bytes), password: str) -> bool:
+        salt, iterations, digest = record
+        if not salt:
+            return hmac.compare_digest(digest, password.encode())
+        return hmac.compare_digest(digest, self.hash_password(password, salt, iterations))
+
+    def append(self, name: str, record: (bytes, int, bytes)):
+        salt, iterations, digest = record
+        line = json.dumps({'name': name, 'salt': salt.hex(), 'iterations': iterations, 'hash': digest.hex()})
+        with self.io_lock:
+            with open(self.log_path, 'a') as file:
+                file.write(line + '\n')
+
+    def drop_legacy(self, name: str):
+        # only once the hash is in the log, a crash in between keeps the account
+        with self.lock:
+            if self.legacy.pop(name, None) is None:
+                return
+            self.legacy_dirty = True
+        self.write_legacy()
+
+    def write_legacy(self):
+        # upgrades waiting on the lock are covered by whoever writes first
+        with self.legacy_lock:
+            with self.lock:
+                if not self.legacy_dirty:
+                    return
+                legacy = dict(self.legacy)
+                self.legacy_dirty = False
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as file:
+                json.dump(legacy, file, indent=4)
+            os.replace(tmp_path, self.path)
+
+    def close(self):
+        self.executor.shutdown()